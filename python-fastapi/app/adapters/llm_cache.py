@@ -0,0 +1,108 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.repositories.sqlite_store import SqliteTable, store
+
+
+class LlmCache:
+    """
+    Response cache for deterministic Ollama calls.
+
+    Tier 1: in-memory LRU bounded by total size of the cached JSON.
+    Tier 2 (optional): SQLite table, survives restarts and is shared by workers.
+    Entries expire after ttl seconds in both tiers.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, disk: bool = False):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk: Optional[SqliteTable] = SqliteTable(store, "llm_cache", cache_ttl=0) if disk else None
+        # key -> (expires_at, raw json)
+        self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._last_purge = 0.0
+
+    @staticmethod
+    def key(endpoint: str, payload: Dict[str, Any]) -> str:
+        # payload already holds model, prompt/messages, format and options
+        body = {k: v for k, v in payload.items() if k != "stream"}
+        canonical = json.dumps({"endpoint": endpoint, "payload": body}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                expires_at, raw = hit
+                if expires_at > now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(raw)
+                self._drop(key)
+
+        if self.disk is not None:
+            row = self.disk.get(key)
+            if row and row["expires_at"] > now:
+                raw = json.dumps(row["data"], ensure_ascii=False)
+                with self._lock:
+                    self._put_mem(key, row["expires_at"], raw)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return row["data"]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: Dict[str, Any]) -> None:
+        expires_at = time.time() + self.ttl
+        raw = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self._put_mem(key, expires_at, raw)
+
+        if self.disk is not None:
+            self.disk[key] = {"expires_at": expires_at, "data": data}
+            # drop expired rows now and then; by expires_at, since created_at
+            # is kept when a key is written again
+            if time.time() - self._last_purge > 600:
+                self._last_purge = time.time()
+                self.disk.purge_field_older_than("expires_at", 0)
+
+    def _put_mem(self, key: str, expires_at: float, raw: str) -> None:
+        size = len(raw)
+        if size > self.max_bytes:
+            return
+        self._drop(key)
+        self._mem[key] = (expires_at, raw)
+        self._mem_bytes += size
+        while self._mem_bytes > self.max_bytes:
+            _k, (_exp, old) = self._mem.popitem(last=False)
+            self._mem_bytes -= len(old)
+
+    def _drop(self, key: str) -> None:
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old[1])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "entries": len(self._mem),
+                "bytes": self._mem_bytes,
+                "max_bytes": self.max_bytes,
+                "disk": self.disk is not None,
+            }
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Deque, Dict
+
+
+class Priority(IntEnum):
+    # lower value = served first
+    CHAT = 0
+    FAQ_BUILD = 1
+    BACKGROUND = 2
+
+
+class LlmScheduler:
+    """
+    Decides which waiting Ollama request goes next.
+
+    - at most `capacity` requests run at once (all classes together)
+    - strict priority between classes, each class also has its own running limit
+    - FAQ and background work together never take the last slot, so a chat
+      request always finds one free (if capacity > 1)
+    - inside a class, documents are served round-robin, so one document with
+      many queued requests can't starve the others
+    """
+
+    def __init__(self, capacity: int, limits: Dict[Priority, int]):
+        self.capacity = max(1, capacity)
+        self.limits = {p: max(1, min(limits.get(p, self.capacity), self.capacity)) for p in Priority}
+        # combined cap for everything that isn't chat
+        self.non_chat_limit = max(1, self.capacity - 1)
+        non_chat = sum(self.limits[p] for p in Priority if p != Priority.CHAT)
+        if non_chat >= self.capacity:
+            print(
+                f"[llm_scheduler] FAQ + background limits ({non_chat}) >= capacity ({self.capacity}), "
+                f"together they are capped at {self.non_chat_limit}"
+            )
+        self.running = 0
+        self._running: Dict[Priority, int] = {p: 0 for p in Priority}
+        # per class: doc_key -> waiting futures; key order is the round-robin order
+        self._queues: Dict[Priority, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            p: OrderedDict() for p in Priority
+        }
+        self._granted: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._wait_total: Dict[Priority, float] = {p: 0.0 for p in Priority}
+        self._wait_max: Dict[Priority, float] = {p: 0.0 for p in Priority}
+        # recent waits for percentiles
+        self._recent: Dict[Priority, Deque[float]] = {p: deque(maxlen=500) for p in Priority}
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, doc_key: str = "") -> AsyncIterator[float]:
+        """Waits for a slot; yields the time spent queued (seconds)."""
+        waited = await self.acquire(priority, doc_key)
+        try:
+            yield waited
+        finally:
+            self.release(priority)
+
+    async def acquire(self, priority: Priority, doc_key: str = "") -> float:
+        started = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(doc_key, deque()).append(fut)
+        self._dispatch()
+
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # slot was granted just before we got cancelled, hand it back
+                self.release(priority)
+            else:
+                self._forget(priority, doc_key, fut)
+            raise
+
+        waited = time.monotonic() - started
+        self._granted[priority] += 1
+        self._wait_total[priority] += waited
+        self._wait_max[priority] = max(self._wait_max[priority], waited)
+        self._recent[priority].append(waited)
+        return waited
+
+    def release(self, priority: Priority) -> None:
+        self.running -= 1
+        self._running[priority] -= 1
+        self._dispatch()
+
+    def _forget(self, priority: Priority, doc_key: str, fut: asyncio.Future) -> None:
+        q = self._queues[priority].get(doc_key)
+        if q is None:
+            return
+        try:
+            q.remove(fut)
+        except ValueError:
+            pass
+        if not q:
+            del self._queues[priority][doc_key]
+
+    def _dispatch(self) -> None:
+        while self.running < self.capacity:
+            fut = self._next()
+            if fut is None:
+                return
+            fut.set_result(None)
+
+    def _next(self):
+        for p in Priority:
+            queues = self._queues[p]
+            if not queues or self._running[p] >= self.limits[p]:
+                continue
+            if p != Priority.CHAT and self.running - self._running[Priority.CHAT] >= self.non_chat_limit:
+                continue
+            while queues:
+                doc_key, q = next(iter(queues.items()))
+                fut = q.popleft()
+                # rotate: this document goes to the back of the line
+                if q:
+                    queues.move_to_end(doc_key)
+                else:
+                    del queues[doc_key]
+                if fut.cancelled():
+                    continue
+                self.running += 1
+                self._running[p] += 1
+                return fut
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"capacity": self.capacity, "running": self.running, "classes": {}}
+        for p in Priority:
+            recent = sorted(self._recent[p])
+            granted = self._granted[p]
+            out["classes"][p.name.lower()] = {
+                "limit": self.limits[p],
+                "running": self._running[p],
+                "queued": sum(len(q) for q in self._queues[p].values()),
+                "queued_documents": len(self._queues[p]),
+                "granted": granted,
+                "wait_avg_s": (self._wait_total[p] / granted) if granted else 0.0,
+                "wait_p95_s": recent[int(0.95 * (len(recent) - 1))] if recent else 0.0,
+                "wait_max_s": self._wait_max[p],
+            }
+        return out
@@ -1,13 +1,153 @@
+import asyncio
+import json
 import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
 import httpx
 
+from app.core import metrics
+from app.core.config import settings
+from app.adapters.llm_cache import LlmCache
+from app.adapters.llm_scheduler import LlmScheduler, Priority
+
+class _Flight:
+    """One upstream call shared by every identical request that arrives while it runs."""
+
+    def __init__(self, task: "asyncio.Task[dict]"):
+        self.task = task
+        self.waiters = 0
+
+def _prompt_chars(payload: dict) -> int:
+    if "messages" in payload:
+        return sum(len(m.get("content") or "") for m in payload["messages"])
+    if "input" in payload:
+        return sum(len(t) for t in payload["input"])
+    return len(payload.get("prompt") or "")
+
+def _record_queue_wait(endpoint: str, priority: Priority, waited: float) -> None:
+    metrics.LLM_QUEUE_SECONDS.observe(waited, endpoint=endpoint, priority=priority.name.lower())
+    metrics.record("llm_queue", waited)
+
+def _record_request(endpoint: str, seconds: float, data: dict) -> None:
+    metrics.LLM_REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
+    metrics.record("llm_request", seconds)
+    metrics.record_ollama(endpoint, data)
+
 class OllamaClient:
+    # one pooled client for the whole app (see startup/shutdown),
+    # so creating an OllamaClient() is cheap and connections are kept alive
+    _http: Optional[httpx.AsyncClient] = None
+    # every request to Ollama waits here for a slot (priority + per-document fairness)
+    scheduler = LlmScheduler(
+        settings.ollama_max_inflight,
+        {
+            Priority.CHAT: settings.llm_limit_chat,
+            Priority.FAQ_BUILD: settings.llm_limit_faq_build,
+            Priority.BACKGROUND: settings.llm_limit_background,
+        },
+    )
+    cache: Optional[LlmCache] = (
+        LlmCache(settings.llm_cache_max_bytes, settings.llm_cache_ttl_seconds, settings.llm_cache_disk)
+        if settings.llm_cache_enabled else None
+    )
+    # cache key -> in-flight upstream call (single-flight)
+    _flights: Dict[str, _Flight] = {}
+
     def __init__(self):
         self.base_url = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
         self.model = os.getenv("OLLAMA_MODEL", "llama3.2:3b")
-        
-    async def generate(self, prompt: str) -> str:
-        url = f"{self.base_url}/api/generate"
+
+    @classmethod
+    async def startup(cls) -> None:
+        if cls._http is None:
+            cls._http = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.ollama_max_connections,
+                    max_keepalive_connections=settings.ollama_max_keepalive,
+                    keepalive_expiry=settings.ollama_keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(settings.ollama_generate_timeout, connect=settings.ollama_connect_timeout),
+            )
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        if cls._http is not None:
+            await cls._http.aclose()
+        cls._http = None
+
+    @staticmethod
+    async def _ensure_started() -> None:
+        if OllamaClient._http is None:
+            # used outside the app lifespan (scripts etc.)
+            await OllamaClient.startup()
+
+    async def _post(
+        self, path: str, payload: dict, timeout: float, priority: Priority, doc_key: str
+    ) -> dict:
+        cache = OllamaClient.cache
+        key = LlmCache.key(path, payload)
+        metrics.LLM_PROMPT_CHARS.observe(_prompt_chars(payload), endpoint=path)
+        if cache is not None:
+            hit = cache.get(key)
+            metrics.LLM_CACHE_TOTAL.inc(result="hit" if hit is not None else "miss")
+            if hit is not None:
+                return hit
+
+        flight = OllamaClient._flights.get(key)
+        if flight is not None and flight.task.cancelling():
+            # being torn down (its last waiter left), don't join it
+            flight = None
+        if flight is None:
+            flight = _Flight(asyncio.create_task(self._fetch(path, payload, timeout, key, priority, doc_key)))
+            OllamaClient._flights[key] = flight
+            flight.task.add_done_callback(lambda _t, key=key, flight=flight: self._land(key, flight))
+
+        flight.waiters += 1
+        try:
+            # shield: a waiter going away must not cancel the call the others wait on
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # nobody left to read the answer, stop spending Ollama time on it;
+                # unregister right away so a retry starts a fresh call
+                if OllamaClient._flights.get(key) is flight:
+                    del OllamaClient._flights[key]
+                flight.task.cancel()
+
+    @staticmethod
+    def _land(key: str, flight: _Flight) -> None:
+        if OllamaClient._flights.get(key) is flight:
+            del OllamaClient._flights[key]
+
+    async def _fetch(
+        self, path: str, payload: dict, timeout: float, key: str, priority: Priority, doc_key: str
+    ) -> dict:
+        await self._ensure_started()
+
+        async with OllamaClient.scheduler.slot(priority, doc_key) as waited:
+            _record_queue_wait(path, priority, waited)
+            started = time.perf_counter()
+            try:
+                r = await OllamaClient._http.post(
+                    f"{self.base_url}{path}",
+                    json=payload,
+                    timeout=httpx.Timeout(timeout, connect=settings.ollama_connect_timeout),
+                )
+                r.raise_for_status()
+                data = r.json()
+            except Exception:
+                metrics.LLM_ERRORS_TOTAL.inc(endpoint=path)
+                raise
+            _record_request(path, time.perf_counter() - started, data)
+
+        if OllamaClient.cache is not None:
+            # "context" is the token array for follow-up calls, big and unused here
+            OllamaClient.cache.put(key, {k: v for k, v in data.items() if k != "context"})
+        return data
+
+    async def generate(self, prompt: str, priority: Priority = Priority.FAQ_BUILD, doc_key: str = "") -> str:
         payload = {
             "model": self.model,
             "prompt": prompt,
@@ -15,44 +155,84 @@ class OllamaClient:
             # keep it short so it finishes fast
             "options": {
                 "temperature": 0.2,
-                "num_predict": 600,
-                "num_ctx": 2048
+                "num_predict": settings.faq_answer_tokens,
+                "num_ctx": settings.llm_num_ctx
             }
         }
-        async with httpx.AsyncClient(timeout=180) as client:  # 3 minutes
-            r = await client.post(url, json=payload)
-            r.raise_for_status()
-            return r.json()["response"]
+        data = await self._post("/api/generate", payload, settings.ollama_generate_timeout, priority, doc_key)
+        return data["response"]
 
-    async def generate_json(self, prompt: str) -> str:
-        url = f"{self.base_url}/api/generate"
+    async def generate_json(self, prompt: str, priority: Priority = Priority.FAQ_BUILD, doc_key: str = "") -> str:
         payload = {
             "model": self.model,
             "prompt": prompt,
             "stream": False,
             "format": "json",
             "options": {
-                "num_ctx": 2048
+                "num_ctx": settings.llm_num_ctx
             }
         }
-        async with httpx.AsyncClient(timeout=120) as client:
-            r = await client.post(url, json=payload)
-            r.raise_for_status()
-            return r.json()["response"]
+        data = await self._post("/api/generate", payload, settings.ollama_generate_json_timeout, priority, doc_key)
+        return data["response"]
 
+    async def embed(
+        self, texts: List[str], priority: Priority = Priority.BACKGROUND, doc_key: str = ""
+    ) -> List[List[float]]:
+        """One embedding per text (batched in a single /api/embed call)."""
+        payload = {"model": settings.ollama_embed_model, "input": texts}
+        data = await self._post("/api/embed", payload, settings.ollama_embed_timeout, priority, doc_key)
+        return data["embeddings"]
 
-    async def chat(self, prompt: str) -> str:
-        url = f"{self.base_url}/api/chat"
-        payload = {
+    def _chat_payload(self, messages: List[Dict[str, str]], stream: bool) -> dict:
+        return {
             "model": self.model,
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant that outputs ONLY valid JSON when asked."},
-                {"role": "user", "content": prompt},
-            ],
-            "stream": False,
+            "messages": messages,
+            "stream": stream,
+            # keep the model (and its prompt cache) loaded between chat turns,
+            # so a follow-up that shares the previous prefix skips most prefill
+            "keep_alive": settings.ollama_keep_alive,
+            # same window the prompt was packed for
+            "options": {"num_ctx": settings.llm_num_ctx},
         }
-        async with httpx.AsyncClient(timeout=60) as client:
-            r = await client.post(url, json=payload)
-            r.raise_for_status()
-            data = r.json()
-            return data["message"]["content"]
+
+    async def chat(
+        self, messages: List[Dict[str, str]], priority: Priority = Priority.CHAT, doc_key: str = ""
+    ) -> str:
+        """messages: [{"role": "system" | "user" | "assistant", "content": ...}, ...]"""
+        payload = self._chat_payload(messages, stream=False)
+        data = await self._post("/api/chat", payload, settings.ollama_chat_timeout, priority, doc_key)
+        return data["message"]["content"]
+
+    async def chat_stream(
+        self, messages: List[Dict[str, str]], priority: Priority = Priority.CHAT, doc_key: str = ""
+    ) -> AsyncIterator[str]:
+        """Yields content deltas from Ollama's streaming NDJSON as they arrive."""
+        await self._ensure_started()
+        payload = self._chat_payload(messages, stream=True)
+        metrics.LLM_PROMPT_CHARS.observe(_prompt_chars(payload), endpoint="/api/chat")
+
+        async with OllamaClient.scheduler.slot(priority, doc_key) as waited:
+            _record_queue_wait("/api/chat", priority, waited)
+            started = time.perf_counter()
+            async with OllamaClient._http.stream(
+                "POST",
+                f"{self.base_url}/api/chat",
+                json=payload,
+                # read timeout applies between chunks here, not to the whole answer
+                timeout=httpx.Timeout(settings.ollama_chat_timeout, connect=settings.ollama_connect_timeout),
+            ) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        metrics.LLM_ERRORS_TOTAL.inc(endpoint="/api/chat")
+                        raise RuntimeError(f"Ollama error: {data['error']}")
+                    delta = (data.get("message") or {}).get("content") or ""
+                    if delta:
+                        yield delta
+                    if data.get("done"):
+                        # last line carries eval_count / eval_duration
+                        _record_request("/api/chat", time.perf_counter() - started, data)
+                        break
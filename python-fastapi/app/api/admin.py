@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from app.core import profiling
+
+router = APIRouter()
+
+def _check_token(token: str) -> None:
+    if not profiling.token_ok(token):
+        # also when profiling is off, don't reveal that the endpoint exists
+        raise HTTPException(status_code=404, detail="Not found")
+
+@router.get("/admin/profiles")
+def list_profiles(x_admin_token: str = Header("")):
+    _check_token(x_admin_token)
+    return {"profiles": profiling.list_profiles()}
+
+@router.get("/admin/profiles/{name}")
+def download_profile(name: str, x_admin_token: str = Header("")):
+    _check_token(x_admin_token)
+    path = profiling.profile_dir() / name
+    if not profiling.NAME_RE.match(name) or not path.is_file():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=name, media_type="application/octet-stream")
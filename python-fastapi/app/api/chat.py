@@ -1,18 +1,79 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+import json
 import traceback
 
 from app.services.chat_service import ChatService
-from app.schemas.models import ChatRequest, ChatResponse
+from app.schemas.models import ChatRequest, ChatResponse, ChatSessionRequest, ChatSessionResponse
 
 router = APIRouter()
 
+def _not_found(e: KeyError) -> HTTPException:
+    # "Document not found" / "Chat session not found"
+    return HTTPException(status_code=404, detail=e.args[0] if e.args else "Not found")
+
+@router.post("/chat/sessions", response_model=ChatSessionResponse)
+def create_chat_session(req: ChatSessionRequest):
+    """
+    Starts a multi-turn chat about one document. Pass the session_id to /chat or
+    /chat/stream: the first question pins the document context, later questions
+    reuse it (and the earlier turns) as the same prompt prefix, so the model
+    only has to process the new question.
+    """
+    try:
+        return ChatService().create_session(req.document_id)
+    except KeyError as e:
+        raise _not_found(e)
+
+@router.delete("/chat/sessions/{session_id}")
+def delete_chat_session(session_id: str):
+    try:
+        ChatService().delete_session(session_id)
+    except KeyError as e:
+        raise _not_found(e)
+    return {"session_id": session_id, "deleted": True}
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(req: ChatRequest):
     try:
-        return await ChatService().answer(req.document_id, req.question)
-    except KeyError:
-        raise HTTPException(status_code=404, detail="Document not found")
+        return await ChatService().answer(req.document_id, req.question, req.session_id)
+    except KeyError as e:
+        raise _not_found(e)
     except Exception as e:
         traceback.print_exc()
         # repr(e) avoids empty "detail": ""
         raise HTTPException(status_code=400, detail=repr(e))
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Same as /chat but streams the answer as Server-Sent Events:
+      event: delta  data: {"text": "..."}
+      event: done   data: {"answer": "...", "matched_snippet": "..."}
+      event: error  data: {"detail": "..."}
+    """
+    try:
+        events = await ChatService().answer_stream(req.document_id, req.question, req.session_id)
+    except KeyError as e:
+        raise _not_found(e)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=400, detail=repr(e))
+
+    async def body():
+        try:
+            async for event, data in events:
+                yield _sse(event, data)
+        except Exception as e:
+            # headers are already sent, report the error in-band
+            traceback.print_exc()
+            yield _sse("error", {"detail": repr(e)})
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
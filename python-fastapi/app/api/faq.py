@@ -1,5 +1,7 @@
+import json
 import time
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from app.services.faq_service import FaqService
 from app.repositories.memory_repo import MemoryRepo
 from app.schemas.models import BuildFaqResponse, FaqResponse
@@ -8,48 +10,98 @@ import asyncio, uuid
 from app.repositories.job_repo import JobRepo
 
 router = APIRouter()
-JOB_TTL_SECONDS = 60 * 10  # 10 min
 
 @router.post("/faq/{faq_id}/extend_async")
 async def extend_async(faq_id: str):
-    faq = MemoryRepo.faqs.get(faq_id)
-    if not faq:
+    job_id = str(uuid.uuid4())
+
+    def claim(faq: dict) -> dict:
+        # test-and-set in one transaction, so two workers can't both start one
+        if not faq.get("extend_running"):
+            faq.update(extend_running=True, extend_job_id=job_id)
+        return faq
+
+    try:
+        faq = await MemoryRepo.faqs.amodify(faq_id, claim)
+    except KeyError:
         raise HTTPException(status_code=404, detail="FAQ not found")
 
-    if faq.get("extend_running"):
+    if faq.get("extend_job_id") != job_id:
         return {"job_id": faq.get("extend_job_id"), "already_running": True}
 
-    job_id = str(uuid.uuid4())
-    faq["extend_running"] = True
-    faq["extend_job_id"] = job_id
-
-    JobRepo.jobs[job_id] = {"status": "running", "faq_id": faq_id, "added": None, "error": None, "ts": time.time()}
+    JobRepo.create(job_id, {"status": "running", "faq_id": faq_id, "added": None, "error": None, "ts": time.time()})
 
     async def runner():
         try:
             res = await FaqService().extend_faq(faq_id)
-            JobRepo.jobs[job_id].update(status="done", added=res["added"])
+            await JobRepo.finish(job_id, status="done", added=res["added"])
+        except asyncio.CancelledError:
+            # DELETE /jobs/{job_id}; the Ollama request was aborted with us
+            await JobRepo.finish(job_id, status="cancelled")
+            raise
         except Exception as e:
-            JobRepo.jobs[job_id].update(status="error", error=repr(e))
+            await JobRepo.finish(job_id, status="error", error=repr(e))
         finally:
-            faq["extend_running"] = False
+            await MemoryRepo.faqs.aupdate_fields(faq_id, extend_running=False)
+            JobRepo.tasks.pop(job_id, None)
 
-    asyncio.create_task(runner())
+    JobRepo.tasks[job_id] = asyncio.create_task(runner())
     return {"job_id": job_id}
 
 @router.get("/jobs/{job_id}")
 def job_status(job_id: str):
-    now = time.time()
-    # cleanup old jobs
-    for jid, job in list(JobRepo.jobs.items()):
-        if now - job.get("ts", now) > JOB_TTL_SECONDS:
-            JobRepo.jobs.pop(jid, None)
-
+    # expired jobs are dropped by the background sweeper, not here
     job = JobRepo.jobs.get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     return job
 
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Stops a running job server-side; finished jobs are returned unchanged."""
+    try:
+        return await JobRepo.cancel(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+@router.get("/jobs/{job_id}/wait")
+async def job_wait(job_id: str, timeout: float = Query(25, ge=0, le=60)):
+    """Long-poll: returns as soon as the job finishes, or the current state after timeout."""
+    try:
+        return await JobRepo.wait(job_id, timeout)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events: one "status" event right away, then the final
+    "done" / "error" event when the job finishes. Comment lines keep the
+    connection alive in between.
+    """
+    job = JobRepo.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def body():
+        current = job
+        yield f"event: status\ndata: {json.dumps(current)}\n\n"
+        while current.get("status") == "running":
+            try:
+                current = await JobRepo.wait(job_id, 15)
+            except KeyError:
+                yield f"event: error\ndata: {json.dumps({'error': 'Job expired'})}\n\n"
+                return
+            if current.get("status") == "running":
+                yield ": keep-alive\n\n"
+        yield f"event: {current.get('status')}\ndata: {json.dumps(current)}\n\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/documents/{document_id}/build_faq")
 async def build_faq(document_id: str):
     try:
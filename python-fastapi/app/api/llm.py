@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+
+from app.adapters.ollama_client import OllamaClient
+
+router = APIRouter()
+
+@router.get("/llm/stats")
+def llm_stats():
+    cache = OllamaClient.cache
+    return {
+        "cache": cache.stats() if cache is not None else None,
+        # distinct upstream calls currently shared by identical requests
+        "inflight_flights": len(OllamaClient._flights),
+        "inflight_waiters": sum(f.waiters for f in OllamaClient._flights.values()),
+        "scheduler": OllamaClient.scheduler.stats(),
+    }
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.ingest_service import IngestService
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from app.services.ingest_service import IngestService, UploadTooLarge
 from app.schemas.models import UploadResponse
 from app.repositories.memory_repo import MemoryRepo
 
 router = APIRouter()
 
 @router.post("/upload", response_model=UploadResponse)
-async def upload(file: UploadFile = File(...)):
+async def upload(file: UploadFile = File(...), incremental: bool = Query(False)):
     try:
-        return await IngestService().save_and_extract(file)
+        return await IngestService().save_and_extract(file, incremental=incremental)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -20,5 +22,14 @@ def get_document(document_id: str):
     return {
         "document_id": document_id,
         "filename": doc["filename"],
-        "text_preview": (doc.get("text") or "")[:800]
-    }
\ No newline at end of file
+        "text_preview": MemoryRepo.get_text(doc, 800),
+        "status": MemoryRepo.document_status(doc),
+    }
+
+@router.delete("/documents/{document_id}")
+async def delete_document(document_id: str):
+    try:
+        await IngestService().delete_document(document_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"document_id": document_id, "deleted": True}
@@ -5,4 +5,102 @@ class Settings(BaseModel):
     uploads_dir: str = os.getenv("UPLOADS_DIR", "data/uploads")
     processed_dir: str = os.getenv("PROCESSED_DIR", "data/processed")
 
+    # documents / faqs / jobs live here (WAL mode, shared by all uvicorn workers)
+    db_path: str = os.getenv("DB_PATH", "data/app.db")
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "4"))
+    # how long a write waits for another worker's lock before failing ("database is locked")
+    db_busy_timeout_ms: int = int(os.getenv("DB_BUSY_TIMEOUT_MS", "2000"))
+
+    # uploads are copied to disk in chunks of this size, never fully in memory
+    upload_chunk_bytes: int = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+    # enforced on the request body (UploadLimitMiddleware), so bigger uploads are cut
+    # off before they are spooled to disk, and again on the stored file
+    max_upload_bytes: int = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+
+    # incremental PDF ingest: pages per step, doubling from first to max
+    # (small first step = chat is available quickly, bigger ones = fewer index rewrites)
+    ingest_first_batch_pages: int = int(os.getenv("INGEST_FIRST_BATCH_PAGES", "4"))
+    ingest_max_batch_pages: int = int(os.getenv("INGEST_MAX_BATCH_PAGES", "64"))
+
+    # finished background jobs are forgotten after this long
+    job_ttl_seconds: float = float(os.getenv("JOB_TTL_SECONDS", str(60 * 10)))
+    # rows older than this are dropped even if still "running" (their worker died)
+    job_orphan_seconds: float = float(os.getenv("JOB_ORPHAN_SECONDS", str(24 * 3600)))
+
+    # extraction process pool (0 = one worker per core) and per-file timeout
+    extract_workers: int = int(os.getenv("EXTRACT_WORKERS", "0")) or (os.cpu_count() or 1)
+    extract_timeout_seconds: float = float(os.getenv("EXTRACT_TIMEOUT_SECONDS", "300"))
+    # spreadsheets are streamed in row batches; rows (per sheet) and cell sizes are capped
+    tabular_batch_rows: int = int(os.getenv("TABULAR_BATCH_ROWS", "5000"))
+    tabular_max_rows: int = int(os.getenv("TABULAR_MAX_ROWS", "200000"))
+    tabular_max_cell_chars: int = int(os.getenv("TABULAR_MAX_CELL_CHARS", "1000"))
+    # PDFs with at least this many pages are split across the pool by page range,
+    # each worker getting no fewer than pdf_min_pages_per_worker pages
+    pdf_parallel_min_pages: int = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+    pdf_min_pages_per_worker: int = int(os.getenv("PDF_MIN_PAGES_PER_WORKER", "16"))
+
+    # shared httpx pool for Ollama (one per app, created in the lifespan hook)
+    ollama_max_connections: int = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "10"))
+    ollama_max_keepalive: int = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "5"))
+    ollama_keepalive_expiry: float = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+    # cap on requests actually sent to Ollama at the same time
+    ollama_max_inflight: int = int(os.getenv("OLLAMA_MAX_INFLIGHT", "4"))
+    # per priority class running limits (within ollama_max_inflight); FAQ build +
+    # background together are also capped at ollama_max_inflight - 1, so chat
+    # always has a free slot (keep their sum below ollama_max_inflight)
+    llm_limit_chat: int = int(os.getenv("LLM_LIMIT_CHAT", "4"))
+    llm_limit_faq_build: int = int(os.getenv("LLM_LIMIT_FAQ_BUILD", "2"))
+    llm_limit_background: int = int(os.getenv("LLM_LIMIT_BACKGROUND", "1"))
+
+    # model context window (num_ctx sent to Ollama); prompts are packed to fit it,
+    # keeping room for the answer (chat / FAQ generation, the latter is also num_predict)
+    llm_num_ctx: int = int(os.getenv("LLM_NUM_CTX", "2048"))
+    chat_answer_tokens: int = int(os.getenv("CHAT_ANSWER_TOKENS", "512"))
+    faq_answer_tokens: int = int(os.getenv("FAQ_ANSWER_TOKENS", "600"))
+    # opt-in: build the first FAQ page in the background right after upload (BACKGROUND
+    # priority, so it never takes chat's slot), "Build FAQ" then returns it or waits for
+    # the running build. Costs Ollama time for every upload, used or not
+    faq_precompute: bool = os.getenv("FAQ_PRECOMPUTE", "0") == "1"
+    # how long Ollama keeps the model loaded after a chat call (Ollama duration, e.g. "30m");
+    # while loaded it reuses the KV cache of a prompt prefix it has seen
+    ollama_keep_alive: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+    # chat sessions (POST /chat/sessions): document context pinned in the system
+    # message + history, so follow-ups share the previous prompt as prefix;
+    # a session is dropped after this long without a question
+    chat_session_ttl_seconds: float = float(os.getenv("CHAT_SESSION_TTL_SECONDS", str(12 * 3600)))
+
+    # per-endpoint timeouts (seconds)
+    ollama_connect_timeout: float = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "10"))
+    ollama_generate_timeout: float = float(os.getenv("OLLAMA_GENERATE_TIMEOUT", "180"))
+    ollama_generate_json_timeout: float = float(os.getenv("OLLAMA_GENERATE_JSON_TIMEOUT", "120"))
+    ollama_chat_timeout: float = float(os.getenv("OLLAMA_CHAT_TIMEOUT", "60"))
+
+    # chunk embeddings for vector retrieval, computed in the background after ingest:
+    # "ollama" (OLLAMA_EMBED_MODEL via /api/embed, docker-compose pulls it), "none"
+    # (BM25 only) or "hash" (lexical stand-in for tests/benchmarks, doesn't help with
+    # paraphrases, so not for real use)
+    embedder: str = os.getenv("EMBEDDER", "none")
+    ollama_embed_model: str = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+    ollama_embed_timeout: float = float(os.getenv("OLLAMA_EMBED_TIMEOUT", "60"))
+    hash_embed_dim: int = int(os.getenv("HASH_EMBED_DIM", "256"))
+    embed_batch_size: int = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+    # "hybrid" (BM25 + vectors, reciprocal rank fusion), "vector" or "bm25";
+    # only applies with an embedder, with EMBEDDER=none it's always BM25
+    retrieval_mode: str = os.getenv("RETRIEVAL_MODE", "hybrid")
+
+    # cache for identical (model, endpoint, prompt, options) Ollama calls
+    llm_cache_enabled: bool = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+    llm_cache_max_bytes: int = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    llm_cache_ttl_seconds: float = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+    # also keep entries in SQLite so they survive restarts
+    llm_cache_disk: bool = os.getenv("LLM_CACHE_DISK", "0") == "1"
+
+    # on-demand request profiling (cProfile), off unless an admin token is set:
+    # send `X-Profile: 1` (or ?profile=1) together with `X-Admin-Token: <token>`
+    profile_admin_token: str = os.getenv("PROFILE_ADMIN_TOKEN", "")
+    profile_dir: str = os.getenv("PROFILE_DIR", "data/profiles")
+    # only the newest N profiles are kept
+    profile_keep: int = int(os.getenv("PROFILE_KEEP", "50"))
+
 settings = Settings()
@@ -0,0 +1,219 @@
+"""
+Small in-process Prometheus metrics (text format 0.0.4), no client library.
+Numbers are per process: with several uvicorn workers each one has its own.
+
+span("retrieve") times a block into stage_seconds{stage="retrieve"} and into
+the current request's Server-Timing header (see ServerTimingMiddleware).
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# seconds, from sub-millisecond chunk lookups up to multi-minute LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+TOKEN_BUCKETS = (10, 25, 50, 100, 200, 400, 800, 1600)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_num(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts (+Inf last), sum)
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[i] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else _num(bound)
+                    le_label = f'le="{le}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le_label)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total[0])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# --- metrics of this app ---
+
+HTTP_SECONDS = Histogram("http_request_duration_seconds", "HTTP request time until the response starts", ("method", "route", "status"))
+STAGE_SECONDS = Histogram("stage_seconds", "Time spent per processing stage", ("stage", "format"))
+LLM_QUEUE_SECONDS = Histogram("llm_queue_wait_seconds", "Time an Ollama request waited for a scheduler slot", ("endpoint", "priority"))
+LLM_REQUEST_SECONDS = Histogram("llm_request_seconds", "Ollama request time (after the slot was granted)", ("endpoint",))
+LLM_EVAL_SECONDS = Histogram("llm_eval_seconds", "Ollama generation time (eval_duration)", ("endpoint",))
+LLM_PROMPT_EVAL_SECONDS = Histogram("llm_prompt_eval_seconds", "Ollama prompt processing time (prompt_eval_duration)", ("endpoint",))
+LLM_EVAL_TOKENS = Histogram("llm_eval_tokens", "Generated tokens per Ollama call (eval_count)", ("endpoint",), TOKEN_BUCKETS)
+LLM_TOKENS_PER_SECOND = Histogram("llm_tokens_per_second", "eval_count / eval_duration per Ollama call", ("endpoint",), RATE_BUCKETS)
+LLM_PROMPT_CHARS = Histogram("llm_prompt_chars", "Prompt size in characters", ("endpoint",), SIZE_BUCKETS)
+LLM_TOKENS_TOTAL = Counter("llm_tokens_total", "Tokens processed by Ollama", ("endpoint", "kind"))
+LLM_CACHE_TOTAL = Counter("llm_cache_requests_total", "LLM response cache lookups", ("result",))
+LLM_ERRORS_TOTAL = Counter("llm_errors_total", "Failed Ollama requests", ("endpoint",))
+CONTEXT_PACKED_TOKENS = Histogram("context_packed_tokens", "Estimated context tokens packed into a prompt", ("endpoint",), SIZE_BUCKETS)
+CONTEXT_PIECES_TOTAL = Counter("context_pieces_total", "Context pieces (chunks, questions) packed / dropped / truncated", ("endpoint", "result"))
+DOCUMENTS_TOTAL = Counter("documents_ingested_total", "Uploaded documents", ("format", "deduplicated"))
+FAQ_BUILDS_TOTAL = Counter("faq_builds_total", "build_faq calls: cached (precomputed / reused), attached (to a running build), built", ("result",))
+
+
+# --- spans / Server-Timing ---
+
+# stage -> seconds for the current request (None outside a request)
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[Dict[str, float]]:
+    return _request_timings.get()
+
+
+def record(stage: str, seconds: float, format: str = "") -> None:
+    """Adds an already measured duration (e.g. scheduler wait) as a stage."""
+    STAGE_SECONDS.observe(seconds, stage=stage, format=format)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str, format: str = "") -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started, format)
+
+
+def record_ollama(endpoint: str, data: dict) -> None:
+    """Ollama's own timings from the final response (durations are in ns)."""
+    eval_count = data.get("eval_count")
+    eval_ns = data.get("eval_duration")
+    if eval_count:
+        LLM_EVAL_TOKENS.observe(eval_count, endpoint=endpoint)
+        LLM_TOKENS_TOTAL.inc(eval_count, endpoint=endpoint, kind="eval")
+    if data.get("prompt_eval_count"):
+        LLM_TOKENS_TOTAL.inc(data["prompt_eval_count"], endpoint=endpoint, kind="prompt")
+    if data.get("prompt_eval_duration"):
+        LLM_PROMPT_EVAL_SECONDS.observe(data["prompt_eval_duration"] / 1e9, endpoint=endpoint)
+    if eval_ns:
+        LLM_EVAL_SECONDS.observe(eval_ns / 1e9, endpoint=endpoint)
+        record("llm_eval", eval_ns / 1e9)
+        if eval_count:
+            LLM_TOKENS_PER_SECOND.observe(eval_count / (eval_ns / 1e9), endpoint=endpoint)
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware (so streaming responses stay streaming): collects the
+    spans of the request and adds them as a Server-Timing header, e.g.
+    `Server-Timing: retrieve;dur=1.2, llm_queue;dur=830.0, total;dur=2950.4`.
+    For streamed responses only stages finished before the first byte are in it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - started
+                route = scope.get("route")
+                HTTP_SECONDS.observe(
+                    total,
+                    method=scope["method"],
+                    route=getattr(route, "path", "unmatched"),
+                    status=str(message["status"]),
+                )
+                parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+                parts.append(f"total;dur={total * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(parts).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
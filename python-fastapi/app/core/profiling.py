@@ -0,0 +1,153 @@
+"""
+On-demand cProfile of single requests, for "this one document is slow" cases.
+
+Only installed when PROFILE_ADMIN_TOKEN is set (see main.py), so there is no
+overhead at all otherwise. A request is profiled when it has `X-Profile: 1`
+(or `?profile=1`) and `X-Admin-Token: <token>`. The .prof file (pstats, open
+with snakeviz or `python -m pstats`; speedscope can import it too) and a .json
+with the request's Server-Timing stages go to PROFILE_DIR. Only the newest
+PROFILE_KEEP profiles are kept.
+
+cProfile only sees the event loop thread, so while profiling, extraction runs
+inline instead of in the process pool (see ExtractionPool.run). Time spent
+awaiting Ollama doesn't show up in cProfile, it's in the .json stages
+(llm_queue / llm_request / llm_eval). Other requests served while this one
+awaits end up in the same profile.
+"""
+import asyncio
+import cProfile
+import hmac
+import json
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List
+from urllib.parse import parse_qs
+
+from app.core import metrics
+from app.core.config import settings
+
+# {"on": True} while the current request is being profiled; a mutable holder
+# so background tasks started by the request (they copy the context) stop
+# counting as profiled once the request is done
+_active: ContextVar[Dict[str, bool]] = ContextVar("profiling_active", default={"on": False})
+
+NAME_RE = re.compile(r"^[\w.-]+\.(prof|json)$")
+
+
+def active() -> bool:
+    return _active.get()["on"]
+
+
+def token_ok(token: str) -> bool:
+    expected = settings.profile_admin_token
+    return bool(expected) and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def profile_dir() -> Path:
+    return Path(settings.profile_dir)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    out = []
+    for prof in sorted(profile_dir().glob("*.prof"), key=lambda p: p.stat().st_mtime, reverse=True):
+        meta_path = prof.with_suffix(".json")
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = {}
+        out.append({"name": prof.name, "size": prof.stat().st_size, **meta})
+    return out
+
+
+def _rotate(keep: int) -> None:
+    profiles = sorted(profile_dir().glob("*.prof"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in profiles[max(0, keep):]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".json").unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """Pure ASGI, so streamed responses are profiled until the last byte."""
+
+    def __init__(self, app):
+        self.app = app
+        # cProfile can only run one profiler per thread
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _requested(scope) -> bool:
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-profile", b"").strip() in (b"1", b"true"):
+            return True
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return query.get("profile", [""])[0] in ("1", "true")
+
+    async def _reply(self, send, status: int, detail: str) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            return await self.app(scope, receive, send)
+
+        token = dict(scope.get("headers") or []).get(b"x-admin-token", b"").decode("latin-1")
+        if not token_ok(token):
+            return await self._reply(send, 403, "Profiling needs a valid X-Admin-Token")
+        if self._lock.locked():
+            return await self._reply(send, 409, "Another request is being profiled")
+
+        async with self._lock:
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{_slug(scope['path'])}-{uuid.uuid4().hex[:8]}"
+            status = {"code": None}
+
+            async def send_with_name(message):
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-profile-name", f"{name}.prof".encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            profiler = cProfile.Profile()
+            holder = {"on": True}
+            flag = _active.set(holder)
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_name)
+            finally:
+                profiler.disable()
+                holder["on"] = False
+                _active.reset(flag)
+                elapsed = time.perf_counter() - started
+                await asyncio.to_thread(
+                    self._save, profiler, name,
+                    {
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status["code"],
+                        "seconds": round(elapsed, 4),
+                        "created": time.time(),
+                        "stages_ms": {k: round(v * 1000, 2) for k, v in (metrics.current_timings() or {}).items()},
+                    },
+                )
+
+    @staticmethod
+    def _save(profiler: cProfile.Profile, name: str, meta: Dict[str, Any]) -> None:
+        out = profile_dir()
+        out.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(out / f"{name}.prof"))
+        (out / f"{name}.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        _rotate(settings.profile_keep)
+
+
+def _slug(path: str) -> str:
+    return re.sub(r"[^\w]+", "_", path).strip("_")[:60] or "root"
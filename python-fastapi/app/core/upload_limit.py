@@ -0,0 +1,71 @@
+"""
+Rejects oversized uploads before Starlette's multipart parser spools them
+to disk: by Content-Length up front, and for bodies without one (chunked)
+by counting bytes as they are received, cutting the request off at the limit.
+IngestService._save_upload still checks the exact file size.
+"""
+import json
+
+# multipart boundaries / part headers around the file
+MULTIPART_SLACK_BYTES = 64 * 1024
+
+
+class UploadLimitMiddleware:
+    """Pure ASGI, only looks at requests to `paths`."""
+
+    def __init__(self, app, max_bytes: int, paths=("/upload",)):
+        self.app = app
+        self.limit = max_bytes + MULTIPART_SLACK_BYTES
+        self.max_bytes = max_bytes
+        self.paths = set(paths)
+
+    async def _reply_too_large(self, send) -> None:
+        body = json.dumps({"detail": f"File too large (max {self.max_bytes} bytes)"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        length = dict(scope.get("headers") or []).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.limit:
+            return await self._reply_too_large(send)
+
+        state = {"received": 0, "over": False, "started": False}
+
+        async def limited_receive():
+            if state["over"]:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > self.limit:
+                    # looks like a disconnect to the app, it stops reading the body
+                    state["over"] = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if state["over"] and not state["started"]:
+                # the app's own error response, the 413 below replaces it
+                return
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not state["over"]:
+                raise
+        if state["over"] and not state["started"]:
+            await self._reply_too_large(send)
@@ -1,9 +1,45 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from app.api.upload import router as upload_router
 from app.api.faq import router as faq_router
 from app.api.chat import router as chat_router
+from app.api.llm import router as llm_router
+from app.api.metrics import router as metrics_router
+from app.api.admin import router as admin_router
+from app.adapters.ollama_client import OllamaClient
+from app.services.extraction_pool import ExtractionPool
+from app.repositories.job_repo import JobRepo
+from app.repositories.memory_repo import MemoryRepo
+from app.core.config import settings
+from app.core.metrics import ServerTimingMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.core.upload_limit import UploadLimitMiddleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await OllamaClient.startup()
+    await ExtractionPool.start()
+    background = [
+        asyncio.create_task(JobRepo.sweeper(settings.job_ttl_seconds)),
+        asyncio.create_task(JobRepo.cancel_watcher()),
+        asyncio.create_task(MemoryRepo.session_sweeper(settings.chat_session_ttl_seconds)),
+    ]
+    yield
+    for task in background:
+        task.cancel()
+    ExtractionPool.shutdown()
+    await OllamaClient.shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+if settings.profile_admin_token:
+    # not installed at all without a token, so zero overhead by default
+    app.add_middleware(ProfilingMiddleware)
+# oversized uploads are refused before the body is spooled to disk
+app.add_middleware(UploadLimitMiddleware, max_bytes=settings.max_upload_bytes)
+# per-stage timings of each request as a Server-Timing header (+ /metrics)
+app.add_middleware(ServerTimingMiddleware)
 
 @app.get("/")
 def root():
@@ -12,3 +48,6 @@ def root():
 app.include_router(upload_router)
 app.include_router(faq_router)
 app.include_router(chat_router)
+app.include_router(llm_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
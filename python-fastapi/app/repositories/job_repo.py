@@ -1,5 +1,129 @@
-from typing import Dict, Any
+import asyncio
+import heapq
 import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.repositories.sqlite_store import SqliteTable, store
 
 class JobRepo:
-    jobs: Dict[str, Dict[str, Any]] = {}
+    # no cache: status is written by whichever worker runs the job
+    jobs: SqliteTable = SqliteTable(store, "jobs", cache_ttl=0)
+
+    # set when a job run by this process finishes, wakes /jobs/{id}/wait and /events
+    _events: Dict[str, asyncio.Event] = {}
+    # (expires_at, job_id) min-heap of finished jobs for TTL eviction, see sweep()
+    _expiry: List[Tuple[float, str]] = []
+    # tasks of jobs running in this process, so they can be cancelled
+    tasks: Dict[str, "asyncio.Task"] = {}
+
+    @classmethod
+    def create(cls, job_id: str, job: Dict[str, Any]) -> None:
+        # expires settings.job_ttl_seconds after finish(), running jobs are never swept
+        cls.jobs[job_id] = job
+        cls._events[job_id] = asyncio.Event()
+
+    @classmethod
+    async def update(cls, job_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        """update_fields() that ignores jobs already gone (swept / expired), returns None then."""
+        try:
+            return await cls.jobs.aupdate_fields(job_id, **fields)
+        except KeyError:
+            return None
+
+    @classmethod
+    async def finish(cls, job_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        finished_at = time.time()
+        job = await cls.update(job_id, finished_at=finished_at, **fields)
+        heapq.heappush(cls._expiry, (finished_at + settings.job_ttl_seconds, job_id))
+        event = cls._events.get(job_id)
+        if event is not None:
+            event.set()
+        return job
+
+    @classmethod
+    async def wait(cls, job_id: str, timeout: float, poll_interval: float = 1.0) -> Dict[str, Any]:
+        """
+        Returns the job once it is no longer running, or as-is after timeout.
+        Jobs of this process wake us through their event; jobs run by another
+        worker are re-read every poll_interval.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = cls.jobs[job_id]
+            remaining = deadline - time.monotonic()
+            if job.get("status") != "running" or remaining <= 0:
+                return job
+
+            event = cls._events.get(job_id)
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), remaining)
+                else:
+                    await asyncio.sleep(min(poll_interval, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    async def cancel(cls, job_id: str, grace: float = 5.0) -> Dict[str, Any]:
+        """
+        Cancels a running job. If this process runs it, the task is cancelled
+        right away (which also aborts its in-flight Ollama request); otherwise
+        the request is recorded and picked up by the owner's cancel_watcher.
+        """
+        job = cls.jobs[job_id]
+        if job.get("status") != "running":
+            return job
+
+        task = cls.tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+            await asyncio.wait({task}, timeout=grace)
+            return cls.jobs[job_id]
+
+        await cls.update(job_id, cancel_requested=True)
+        return await cls.wait(job_id, grace)
+
+    @classmethod
+    async def cancel_watcher(cls, interval: float = 1.0) -> None:
+        """Cancels local tasks whose job was cancelled through another worker."""
+        while True:
+            await asyncio.sleep(interval)
+            for job_id, task in list(cls.tasks.items()):
+                job = cls.jobs.get(job_id)
+                if job and job.get("cancel_requested") and not task.done():
+                    task.cancel()
+
+    @classmethod
+    async def sweep(cls, ttl: float) -> int:
+        """
+        Drops jobs finished more than ttl ago: O(expired * log n) via the heap
+        for jobs of this process, plus a delete on finished_at (a scan, the
+        table is small) for jobs finished by other workers / before a restart.
+        """
+        now = time.time()
+        expired = []
+        while cls._expiry and cls._expiry[0][0] <= now:
+            _exp, job_id = heapq.heappop(cls._expiry)
+            cls._events.pop(job_id, None)
+            expired.append(job_id)
+
+        def drop() -> int:
+            dropped = sum(cls.jobs.pop(job_id, None) is not None for job_id in expired)
+            dropped += cls.jobs.purge_field_older_than("finished_at", ttl)
+            # still "running" long after any job could: left behind by a dead worker
+            dropped += cls.jobs.purge_older_than(settings.job_orphan_seconds)
+            return dropped
+
+        return await asyncio.to_thread(drop)
+
+    @classmethod
+    async def sweeper(cls, ttl: float, interval: Optional[float] = None) -> None:
+        interval = interval or min(60.0, ttl / 4)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await cls.sweep(ttl)
+            except Exception:
+                # never let the sweeper die, next round will retry
+                pass
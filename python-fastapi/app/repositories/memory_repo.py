@@ -1,6 +1,53 @@
-from typing import Dict, Any
+import asyncio
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from app.repositories.sqlite_store import SqliteTable, store
 
 class MemoryRepo:
-    documents: Dict[str, Dict[str, Any]] = {}
+    # name kept from the in-memory days, rows are persisted in SQLite now.
+    # Document rows hold metadata only, the text stays in processed/*.txt.
+    # Rows are write-once, so they can be cached long; deletes reach other
+    # workers' caches through the deletions log (see SqliteTable)
+    documents: SqliteTable = SqliteTable(store, "documents", cache_ttl=60)
+
+    faqs: SqliteTable = SqliteTable(store, "faqs", cache_ttl=2)
+
+    # content-addressed uploads: "<sha256><ext>" -> stored files, refcount, built faq_id.
+    # Documents are aliases pointing at a blob.
+    # Short cache: status / refcount / faq_id change, writes by this worker update
+    # it right away, those of other workers show up within 2s
+    blobs: SqliteTable = SqliteTable(store, "blobs", cache_ttl=2)
+
+    # chat sessions: pinned system prompt + message history, appended by any worker
+    chat_sessions: SqliteTable = SqliteTable(store, "chat_sessions", cache_ttl=0)
+
+    @classmethod
+    async def session_sweeper(cls, ttl: float, interval: Optional[float] = None) -> None:
+        """Drops chat sessions with no activity (updated_at) for `ttl` seconds."""
+        interval = interval or min(600.0, ttl / 4)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await cls.chat_sessions.apurge_field_older_than("updated_at", ttl)
+            except Exception:
+                # next round will retry
+                pass
+
+    @classmethod
+    def document_status(cls, doc: Dict[str, Any]) -> str:
+        """"ready", or "indexing" / "partial" / "error" for incremental ingests."""
+        blob = cls.blobs.get(doc.get("blob") or "")
+        return (blob or {}).get("status") or "ready"
 
-    faqs: Dict[str, Dict[str, Any]] = {}
+    @staticmethod
+    def get_text(doc: Dict[str, Any], max_chars: Optional[int] = None) -> str:
+        """Loads document text lazily from its processed file (or just the first max_chars)."""
+        path = doc.get("text_path")
+        if not path:
+            return ""
+        try:
+            with open(Path(path), encoding="utf-8") as f:
+                return f.read() if max_chars is None else f.read(max_chars)
+        except FileNotFoundError:
+            return ""
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, MutableMapping, Optional, Tuple
+
+from app.core.config import settings
+
+# cached tables check the deletions log at most this often
+TOMBSTONE_POLL_SECONDS = 1.0
+# deletions log entries are kept this long (longer than any poll gap)
+TOMBSTONE_KEEP_SECONDS = 3600.0
+
+
+class SqliteStore:
+    """
+    Small connection pool over one SQLite file in WAL mode, so several
+    uvicorn workers (processes) can read and write the same data.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._tables: set = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        # calls run on the event loop thread, so a locked database must not stall it
+        # for long; WAL writes take milliseconds, the short timeout only hits on real trouble
+        timeout_ms = settings.db_busy_timeout_ms
+        conn = sqlite3.connect(self.path, timeout=timeout_ms / 1000, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(timeout_ms)}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.pool_size
+                if can_create:
+                    self._created += 1
+            conn = self._connect() if can_create else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def ensure_table(self, name: str) -> None:
+        if name in self._tables:
+            return
+        with self.connection() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_created_at ON {name}(created_at)")
+            # deletions log, lets other workers evict deleted rows from their caches
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {name}_deleted ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, deleted_at REAL NOT NULL)"
+            )
+        self._tables.add(name)
+
+
+class SqliteTable(MutableMapping):
+    """
+    Dict-like JSON table (key -> dict) with an in-process read-through cache.
+
+    Values are copies: mutating a returned dict does NOT persist it,
+    write it back (table[key] = value) or use update_fields().
+
+    cache_ttl bounds how stale a cached row may be when another worker
+    wrote it (None = never expires, 0 = no cache). Deletes are logged, and
+    cached rows another worker deleted are evicted within
+    TOMBSTONE_POLL_SECONDS, so deleted rows are never served for long.
+    """
+
+    def __init__(self, store: SqliteStore, name: str, cache_size: int = 1024, cache_ttl: Optional[float] = None):
+        self.store = store
+        self.name = name
+        self.cache_size = cache_size if cache_ttl != 0 else 0
+        self.cache_ttl = cache_ttl
+        # last deletions-log entry applied to the cache (None = not read yet)
+        self._deleted_seq: Optional[int] = None
+        self._deleted_checked = 0.0
+        # key -> (loaded_at, json string); strings so callers can't mutate the cache
+        self._cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    # --- cache ---
+
+    def _sync_deletes(self) -> None:
+        """Evicts rows other workers deleted (polls the deletions log at most every TOMBSTONE_POLL_SECONDS)."""
+        now = time.monotonic()
+        if self._deleted_seq is not None and now - self._deleted_checked < TOMBSTONE_POLL_SECONDS:
+            return
+        self._deleted_checked = now
+        self.store.ensure_table(self.name)
+        with self.store.connection() as conn:
+            if self._deleted_seq is None:
+                # nothing is cached yet, start from the end of the log
+                rows = []
+                last = conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {self.name}_deleted").fetchone()[0]
+            else:
+                rows = conn.execute(
+                    f"SELECT seq, key FROM {self.name}_deleted WHERE seq > ? ORDER BY seq", (self._deleted_seq,)
+                ).fetchall()
+                last = rows[-1][0] if rows else self._deleted_seq
+        with self._cache_lock:
+            for _seq, key in rows:
+                self._cache.pop(key, None)
+            self._deleted_seq = max(self._deleted_seq or 0, last)
+
+    def _log_delete(self, conn: sqlite3.Connection, key: str) -> None:
+        now = time.time()
+        conn.execute(f"INSERT INTO {self.name}_deleted (key, deleted_at) VALUES (?, ?)", (key, now))
+        conn.execute(f"DELETE FROM {self.name}_deleted WHERE deleted_at < ?", (now - TOMBSTONE_KEEP_SECONDS,))
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        if not self.cache_size:
+            return None
+        self._sync_deletes()
+        with self._cache_lock:
+            hit = self._cache.get(key)
+            if hit is None:
+                return None
+            loaded_at, raw = hit
+            if self.cache_ttl is not None and time.monotonic() - loaded_at > self.cache_ttl:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return raw
+
+    def _cache_put(self, key: str, raw: str) -> None:
+        if not self.cache_size:
+            return
+        if self._deleted_seq is None:
+            self._sync_deletes()
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic(), raw)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, key: str) -> None:
+        with self._cache_lock:
+            self._cache.pop(key, None)
+
+    # --- mapping ---
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        raw = self._cache_get(key)
+        if raw is None:
+            self.store.ensure_table(self.name)
+            with self.store.connection() as conn:
+                row = conn.execute(f"SELECT value FROM {self.name} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            raw = row[0]
+            self._cache_put(key, raw)
+        return json.loads(raw)
+
+    def __setitem__(self, key: str, value: Dict[str, Any]) -> None:
+        raw = json.dumps(value, ensure_ascii=False)
+        self.store.ensure_table(self.name)
+        with self.store.connection() as conn:
+            # keep the original created_at on overwrite
+            conn.execute(
+                f"INSERT INTO {self.name} (key, value, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, raw, time.time()),
+            )
+        self._cache_put(key, raw)
+
+    def __delitem__(self, key: str) -> None:
+        self.store.ensure_table(self.name)
+        with self.store.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = conn.execute(f"DELETE FROM {self.name} WHERE key = ?", (key,))
+                if cur.rowcount:
+                    self._log_delete(conn, key)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self._cache_drop(key)
+        if cur.rowcount == 0:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        self.store.ensure_table(self.name)
+        with self.store.connection() as conn:
+            keys = [r[0] for r in conn.execute(f"SELECT key FROM {self.name}")]
+        return iter(keys)
+
+    def __len__(self) -> int:
+        self.store.ensure_table(self.name)
+        with self.store.connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self[key]  # type: ignore[index]
+            return True
+        except KeyError:
+            return False
+
+    # --- helpers ---
+
+    def modify(
+        self,
+        key: str,
+        fn: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+        default: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomic read-modify-write (safe across workers). fn gets the current value
+        (or a copy of default if the row is missing) and returns the new value,
+        or None to delete the row. Raises KeyError if missing and no default.
+        """
+        self.store.ensure_table(self.name)
+        with self.store.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(f"SELECT value FROM {self.name} WHERE key = ?", (key,)).fetchone()
+                if row is None and default is None:
+                    raise KeyError(key)
+                value = fn(json.loads(row[0]) if row else json.loads(json.dumps(default)))
+                if value is None:
+                    conn.execute(f"DELETE FROM {self.name} WHERE key = ?", (key,))
+                    if row is not None:
+                        self._log_delete(conn, key)
+                    raw = None
+                else:
+                    raw = json.dumps(value, ensure_ascii=False)
+                    conn.execute(
+                        f"INSERT INTO {self.name} (key, value, created_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                        (key, raw, time.time()),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if raw is None:
+            self._cache_drop(key)
+        else:
+            self._cache_put(key, raw)
+        return value
+
+    def update_fields(self, key: str, **fields: Any) -> Dict[str, Any]:
+        """Atomic update of a few top-level fields."""
+        def apply(value: Dict[str, Any]) -> Dict[str, Any]:
+            value.update(fields)
+            return value
+        return self.modify(key, apply)
+
+    def purge_field_older_than(self, field: str, seconds: float) -> int:
+        """Deletes rows whose numeric top-level `field` (a unix time) is older than `seconds`."""
+        self.store.ensure_table(self.name)
+        with self.store.connection() as conn:
+            cur = conn.execute(
+                f"DELETE FROM {self.name} WHERE json_extract(value, ?) < ?",
+                (f"$.{field}", time.time() - seconds),
+            )
+        if cur.rowcount:
+            with self._cache_lock:
+                self._cache.clear()
+        return cur.rowcount
+
+    def purge_older_than(self, seconds: float) -> int:
+        self.store.ensure_table(self.name)
+        with self.store.connection() as conn:
+            cur = conn.execute(f"DELETE FROM {self.name} WHERE created_at < ?", (time.time() - seconds,))
+        if cur.rowcount:
+            with self._cache_lock:
+                self._cache.clear()
+        return cur.rowcount
+
+    # --- async variants ---
+    # Writes can wait on the SQLite write lock (up to db_busy_timeout_ms), so
+    # code running on the event loop goes through a thread instead.
+
+    async def amodify(
+        self,
+        key: str,
+        fn: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+        default: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.modify, key, fn, default)
+
+    async def aupdate_fields(self, key: str, **fields: Any) -> Dict[str, Any]:
+        return await asyncio.to_thread(lambda: self.update_fields(key, **fields))
+
+    async def apurge_field_older_than(self, field: str, seconds: float) -> int:
+        return await asyncio.to_thread(self.purge_field_older_than, field, seconds)
+
+    async def apurge_older_than(self, seconds: float) -> int:
+        return await asyncio.to_thread(self.purge_older_than, seconds)
+
+
+# shared by all repositories of this process
+store = SqliteStore(settings.db_path, settings.db_pool_size)
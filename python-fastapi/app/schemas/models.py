@@ -1,9 +1,13 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 class UploadResponse(BaseModel):
     document_id: str
     filename: str
+    # True if identical content was uploaded before and its extraction was reused
+    deduplicated: bool = False
+    # set for incremental ingests still running (progress: GET /jobs/{job_id})
+    job_id: Optional[str] = None
 
 class BuildFaqResponse(BaseModel):
     faq_id: str
@@ -22,7 +26,18 @@ class FaqResponse(BaseModel):
 class ChatRequest(BaseModel):
     document_id: str
     question: str
+    # from POST /chat/sessions; without it every question is answered on its own
+    session_id: Optional[str] = None
+
+class ChatSessionRequest(BaseModel):
+    document_id: str
+
+class ChatSessionResponse(BaseModel):
+    session_id: str
+    document_id: str
 
 class ChatResponse(BaseModel):
     answer: str
     matched_snippet: Optional[str] = None
+    # how much retrieved context fit the prompt budget (packed vs dropped)
+    context: Optional[Dict[str, Any]] = None
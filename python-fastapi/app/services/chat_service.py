@@ -1,9 +1,19 @@
 # app/services/chat_service.py
 import re
-from typing import List, Tuple
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
+from app.core import metrics
+from app.core.config import settings
 from app.repositories.memory_repo import MemoryRepo
+from app.adapters.embedder import get_embedder
 from app.adapters.ollama_client import OllamaClient
+from app.adapters.llm_scheduler import Priority
+from app.services.chunk_index import ChunkIndex, load_chunk_index, normalize_text, split_chunks
+from app.services.context_packer import estimate_tokens, pack, prompt_budget
+from app.services.vector_index import load_vector_index, rrf_fuse, vectors_path_for
 
 STOPWORDS = {
     "the","and","for","with","that","this","from","into","your","you","are","was","were","will",
@@ -12,85 +22,297 @@ STOPWORDS = {
     "of","a","an","is","be","by","or","at","it"
 }
 
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
 LOGISTICS_HINTS = {
     "grading","deadline","attendance","schedule","office hours","zoom","link","submission",
     "exam date","date","time","room","campus","policy","late","assignment due","rubric"
 }
 
+SYSTEM_PROMPT = (
+    "You are a helpful course tutor.\n"
+    "Default: focus on COURSE CONTENT (concepts, methods, comparisons, applications, examples).\n"
+    "Only answer logistics (deadlines, grading, schedule) if the user explicitly asks.\n"
+    "If the provided context is insufficient, say what key term/topic is missing and suggest what to search for."
+)
+
+def _trim_history(history: List[Dict[str, str]], allowance: int) -> Tuple[List[Dict[str, str]], int]:
+    """
+    Drops the oldest user/assistant pairs once the history doesn't fit `allowance`
+    tokens. Trims down to half of it in one go: every trim changes the prompt
+    prefix (Ollama has to prefill the rest again), so it shouldn't happen every turn.
+    Returns the kept history and how many messages were dropped.
+    """
+    sizes = [estimate_tokens(m["content"]) for m in history]
+    if sum(sizes) <= allowance:
+        return history, 0
+    target = max(0, allowance) // 2
+    dropped, used = 0, sum(sizes)
+    while dropped < len(history) and used > target:
+        used -= sum(sizes[dropped:dropped + 2])
+        dropped += 2
+    return history[dropped:], dropped
+
 def _strip_model_noise(s: str) -> str:
     s = (s or "").strip()
     s = re.sub(r"^```[a-zA-Z]*\s*", "", s)
     s = re.sub(r"\s*```$", "", s)
     return s.strip()
 
+_LEADING_FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*")
+# trailing whitespace and a (possibly partial) closing fence we can't emit yet
+_HELD_TAIL_RE = re.compile(r"\s*(?:`{1,3}\s*)?$")
+
+class _StreamNoiseStripper:
+    """
+    Incremental version of _strip_model_noise for streamed answers.
+    Holds back the leading fence until it is complete and the trailing
+    whitespace/backticks until we know whether they end the answer.
+    Concatenated output equals _strip_model_noise(full_text).
+    """
+
+    def __init__(self):
+        self._head = ""
+        self._in_head = True
+        self._tail = ""
+
+    def feed(self, delta: str) -> str:
+        if self._in_head:
+            self._head += delta
+            buf = self._head.lstrip()
+            if not buf or "```".startswith(buf):
+                return ""
+            if buf.startswith("```"):
+                m = _LEADING_FENCE_RE.match(buf)
+                if m.end() == len(buf):
+                    # fence language / whitespace may continue in the next delta
+                    return ""
+                buf = buf[m.end():]
+            self._in_head = False
+            self._head = ""
+            delta = buf
+        buf = self._tail + delta
+        cut = _HELD_TAIL_RE.search(buf).start()
+        self._tail = buf[cut:]
+        return buf[:cut]
+
+    def finish(self) -> str:
+        if self._in_head:
+            return _strip_model_noise(self._head)
+        return re.sub(r"\s*```$", "", self._tail.rstrip()).rstrip()
+
 class ChatService:
-    async def answer(self, document_id: str, question: str) -> dict:
+    def __init__(self):
+        self.llm = OllamaClient()
+
+    def create_session(self, document_id: str) -> dict:
+        if not MemoryRepo.documents.get(document_id):
+            raise KeyError("Document not found")
+        session_id = str(uuid.uuid4())
+        # "system" / "pinned" are filled in by the first question
+        MemoryRepo.chat_sessions[session_id] = {
+            "document_id": document_id,
+            "system": None,
+            "pinned": [],
+            "history": [],
+            "updated_at": time.time(),
+        }
+        return {"session_id": session_id, "document_id": document_id}
+
+    def delete_session(self, session_id: str) -> None:
+        try:
+            del MemoryRepo.chat_sessions[session_id]
+        except KeyError:
+            raise KeyError("Chat session not found")
+
+    async def _prepare(self, document_id: str, question: str, session_id: Optional[str] = None) -> dict:
+        """Everything before the LLM call. Returns either a final "answer" or the messages."""
         doc = MemoryRepo.documents.get(document_id)
         if not doc:
             raise KeyError("Document not found")
 
-        text = (doc.get("text") or "").strip()
-        if not text:
-            return {"answer": "Your document text is empty.", "matched_snippet": None}
+        session = None
+        if session_id:
+            session = MemoryRepo.chat_sessions.get(session_id)
+            if not session:
+                raise KeyError("Chat session not found")
+            if session["document_id"] != document_id:
+                raise ValueError("Chat session belongs to another document")
 
         q = (question or "").strip()
+
+        # no chunks <=> no non-whitespace text (or none indexed yet)
+        with metrics.span("load_index"):
+            index = self._load_index(doc)
+        if not len(index):
+            if MemoryRepo.document_status(doc) == "indexing":
+                return {"answer": "The document is still being processed, ask again in a moment.", "matched_snippet": None}
+            return {"answer": "Your document text is empty.", "matched_snippet": None}
+
         if not q:
             return {"answer": "Ask a question first 🙂", "matched_snippet": None}
+        # more candidates than fit; the packer keeps the best ones that fit the window
+        with metrics.span("retrieve"):
+            top = await self._search(doc, document_id, index, q, k=8)
+        candidates = top or [(MemoryRepo.get_text(doc, 2000), 0.0)]
+
+        # show first top chunk as "matched"
+        prep = {"matched_snippet": top[0][0] if top else None, "document_id": document_id}
+        if session is None:
+            prep.update(self._single_turn(q, candidates))
+        else:
+            prep.update(await self._session_turn(session_id, session, q, candidates))
+        return prep
 
-        chunks = self._chunk_text(text)
-        top = self._retrieve_top_chunks(chunks, q, k=4)
-        context = "\n\n---\n\n".join([c for (c, _score) in top]) if top else text[:2000]
+    def _single_turn(self, q: str, candidates: List[Tuple[str, float]]) -> dict:
+        budget = prompt_budget(SYSTEM_PROMPT + self._user_prompt(q, ""), settings.chat_answer_tokens)
+        packed = pack(candidates, budget, CONTEXT_SEPARATOR, endpoint="chat")
+        return {
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": self._user_prompt(q, packed.join(CONTEXT_SEPARATOR))},
+            ],
+            "context": packed.report(),
+        }
 
-        asks_logistics = any(h in q.lower() for h in LOGISTICS_HINTS)
+    async def _session_turn(self, session_id: str, session: dict, q: str, candidates: List[Tuple[str, float]]) -> dict:
+        """
+        Prompt layout whose front stays the same from turn to turn:
+        [system: instructions + pinned document context] + history + new question
+        (+ retrieved chunks that aren't pinned). History keeps the questions without
+        those chunks, so it stays small; Ollama (while the model is loaded) only
+        prefills what changed since the previous turn, not the pinned context.
+        """
+        total = prompt_budget("", settings.chat_answer_tokens)
 
-        system = (
-            "You are a helpful course tutor.\n"
-            "Default: focus on COURSE CONTENT (concepts, methods, comparisons, applications, examples).\n"
-            "Only answer logistics (deadlines, grading, schedule) if the user explicitly asks.\n"
-            "If the provided context is insufficient, say what key term/topic is missing and suggest what to search for."
-        )
+        system = session.get("system")
+        if not system:
+            # first question pins the document context for the whole session
+            pin_budget = total // 3 - estimate_tokens(self._session_system(""))
+            pinned = pack(candidates, pin_budget, CONTEXT_SEPARATOR, endpoint="chat_pinned")
+            first = {"system": self._session_system(pinned.join(CONTEXT_SEPARATOR)), "pinned": pinned.pieces}
+            # two first questions racing: whoever stores first wins, both use that
+            session = await MemoryRepo.chat_sessions.amodify(
+                session_id, lambda s: s if s.get("system") else {**s, **first}
+            )
+            system = session["system"]
 
-        user_prompt = f"""
-QUESTION:
-{q}
+        system_tokens = estimate_tokens(system)
+        question_tokens = estimate_tokens(self._user_prompt(q, ""))
+        # keep a fifth of the window for chunks the pinned context doesn't have
+        allowance = total - system_tokens - question_tokens - total // 5
+        history, dropped = _trim_history(session.get("history") or [], allowance)
+        history_tokens = sum(estimate_tokens(m["content"]) for m in history)
 
-CONTEXT (from the user materials):
-{context}
+        pinned = set(session.get("pinned") or [])
+        extra = [(text, score) for (text, score) in candidates if text not in pinned]
+        budget = max(0, total - system_tokens - question_tokens - history_tokens)
+        packed = pack(extra, budget, CONTEXT_SEPARATOR, endpoint="chat", truncate_first=False)
+        user = self._user_prompt(q, packed.join(CONTEXT_SEPARATOR))
+
+        return {
+            "messages": [{"role": "system", "content": system}, *history, {"role": "user", "content": user}],
+            "context": {
+                **packed.report(),
+                "session_id": session_id,
+                "history_turns": len(history) // 2,
+                "history_dropped_turns": dropped // 2,
+                # the part of the prompt shared with the previous turn
+                "prefix_tokens": system_tokens + history_tokens,
+            },
+            "session": {"id": session_id, "dropped": dropped, "user": self._user_prompt(q, "")},
+        }
+
+    def _session_system(self, context: str) -> str:
+        return f"{SYSTEM_PROMPT}\n\nDOCUMENT CONTEXT (from the user materials):\n{context}"
+
+    def _user_prompt(self, q: str, context: str) -> str:
+        # context first: with the same chunks retrieved, prompts share a longer prefix
+        block = f"CONTEXT (from the user materials):\n{context}\n\n" if context else ""
+        return f"""
+{block}QUESTION:
+{q}
 
 INSTRUCTIONS:
 - If this is a content question: define, compare, and give a small example.
 - If this is a logistics question: answer directly using context.
 """.strip()
 
-        raw = await self._safe_ollama_chat(system, user_prompt)
+    async def _record_turn(self, prep: dict, answer: str) -> None:
+        """Appends the question (without its extra chunks) and the answer to the session history."""
+        turn = prep.get("session")
+        if not turn or not answer:
+            return
+
+        def apply(session: dict) -> dict:
+            history = (session.get("history") or [])[turn["dropped"]:]
+            history += [{"role": "user", "content": turn["user"]}, {"role": "assistant", "content": answer}]
+            return {**session, "history": history, "updated_at": time.time()}
+
+        try:
+            await MemoryRepo.chat_sessions.amodify(turn["id"], apply)
+        except KeyError:
+            # session deleted while the answer was generated
+            pass
+
+    async def answer(self, document_id: str, question: str, session_id: Optional[str] = None) -> dict:
+        prep = await self._prepare(document_id, question, session_id)
+        if "answer" in prep:
+            return prep
+
+        raw = await self._safe_ollama_chat(prep["messages"], prep["document_id"])
         answer = _strip_model_noise(raw)
+        await self._record_turn(prep, answer)
 
-        # show first top chunk as "matched"
-        matched = top[0][0] if top else None
+        return {"answer": answer, "matched_snippet": prep["matched_snippet"], "context": prep["context"]}
 
-        return {"answer": answer, "matched_snippet": matched}
+    async def answer_stream(
+        self, document_id: str, question: str, session_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Validates eagerly (KeyError before anything is streamed), then returns
+        an iterator of ("delta", {"text"}) events and a final ("done", {...}).
+        """
+        prep = await self._prepare(document_id, question, session_id)
+        return self._stream_events(prep)
 
-    async def _safe_ollama_chat(self, system: str, user_prompt: str) -> str:
-        # embed system into user prompt (since your OllamaClient.chat has a fixed system message)
-        prompt = f"SYSTEM:\n{system}\n\n{user_prompt}"
-        return await OllamaClient().chat(prompt)
+    async def _stream_events(self, prep: dict) -> AsyncIterator[Tuple[str, dict]]:
+        if "answer" in prep:
+            yield "delta", {"text": prep["answer"]}
+            yield "done", prep
+            return
+
+        stripper = _StreamNoiseStripper()
+        parts: List[str] = []
+        async for delta in self.llm.chat_stream(prep["messages"], Priority.CHAT, prep["document_id"]):
+            out = stripper.feed(delta)
+            if out:
+                parts.append(out)
+                yield "delta", {"text": out}
+
+        out = stripper.finish()
+        if out:
+            parts.append(out)
+            yield "delta", {"text": out}
+
+        answer = "".join(parts)
+        # only complete answers go into the history (not ones cut off by a disconnect)
+        await self._record_turn(prep, answer)
+        yield "done", {"answer": answer, "matched_snippet": prep["matched_snippet"], "context": prep["context"]}
+
+    async def _safe_ollama_chat(self, messages: List[Dict[str, str]], document_id: str = "") -> str:
+        # interactive: goes ahead of any queued FAQ work
+        return await self.llm.chat(messages, Priority.CHAT, document_id)
+
+    def _load_index(self, doc: dict) -> ChunkIndex:
+        index = load_chunk_index(doc.get("index_path"))
+        if index is None:
+            # documents uploaded before the index existed (or index file lost)
+            index = ChunkIndex.build(MemoryRepo.get_text(doc))
+        return index
 
     def _chunk_text(self, text: str, max_chars: int = 900, overlap: int = 120) -> List[str]:
-        text = re.sub(r"[ \t]+", " ", text)
-        text = re.sub(r"\n{3,}", "\n\n", text)
-
-        chunks = []
-        i = 0
-        n = len(text)
-        while i < n:
-            end = min(i + max_chars, n)
-            chunk = text[i:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            if end == n:
-                break
-            i = max(end - overlap, i + 1)
-        return chunks
+        return split_chunks(normalize_text(text), max_chars, overlap)
 
     def _keywords(self, question: str) -> List[str]:
         toks = re.findall(r"[a-zA-Z0-9]+", question.lower())
@@ -102,17 +324,41 @@ INSTRUCTIONS:
                 out.append(w)
         return out[:18]
 
-    def _retrieve_top_chunks(self, chunks: List[str], question: str, k: int = 4) -> List[Tuple[str, int]]:
+    async def _search(self, doc: dict, document_id: str, index: ChunkIndex, question: str, k: int = 4) -> List[Tuple[str, float]]:
+        """
+        Hybrid retrieval: BM25 and embedding cosine, merged by reciprocal rank
+        fusion. BM25 only while the embeddings aren't computed yet (or are stale).
+        """
+        embedder = get_embedder()
+        vectors = None
+        if settings.retrieval_mode != "bm25" and embedder is not None and doc.get("text_path"):
+            vectors = load_vector_index(vectors_path_for(Path(doc["text_path"]), embedder.name))
+        if vectors is None or len(vectors) != len(index):
+            return self._retrieve_top_chunks(index, question, k)
+
+        try:
+            with metrics.span("embed_query"):
+                qvec = (await embedder.embed([question], Priority.CHAT, document_id))[0]
+        except Exception as e:
+            print(f"[chat] query embedding failed, using BM25 only: {e!r}")
+            return self._retrieve_top_chunks(index, question, k)
+        if qvec.shape[0] != vectors.dim:
+            return self._retrieve_top_chunks(index, question, k)
+
+        # fuse deeper lists than we return, so a chunk ranked well by both wins
+        depth = max(4 * k, 20)
+        dense = vectors.search(qvec, depth)
+        if settings.retrieval_mode == "vector":
+            ranked = dense[:k]
+        else:
+            kws = self._keywords(question)
+            ranked = rrf_fuse(index.search(kws, depth) if kws else [], dense, k=k)
+        return [(index.chunks[i]["text"], score) for (i, score) in ranked]
+
+    def _retrieve_top_chunks(self, index: ChunkIndex, question: str, k: int = 4) -> List[Tuple[str, float]]:
         kws = self._keywords(question)
         if not kws:
-            return [(c, 0) for c in chunks[:k]]
-
-        scored = []
-        for c in chunks:
-            cl = c.lower()
-            score = sum(1 for w in kws if w in cl)
-            if score > 0:
-                scored.append((c, score))
+            return [(c["text"], 0.0) for c in index.chunks[:k]]
 
-        scored.sort(key=lambda x: x[1], reverse=True)
-        return scored[:k]
+        # BM25 over the inverted index built at ingest (whole-token matches only)
+        return [(index.chunks[i]["text"], score) for (i, score) in index.search(kws, k)]
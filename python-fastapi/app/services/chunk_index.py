@@ -0,0 +1,191 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# bump when the on-disk layout changes, old files are then rebuilt from text
+INDEX_VERSION = 3
+
+# standard BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"[a-zA-Z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def split_chunks(text: str, max_chars: int = 900, overlap: int = 120) -> List[str]:
+    """
+    Sliding window over already-normalized text.
+    Returns the stripped chunks.
+    """
+    chunks: List[str] = []
+    i = 0
+    n = len(text)
+    while i < n:
+        end = min(i + max_chars, n)
+        chunk = text[i:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end == n:
+            break
+        i = max(end - overlap, i + 1)
+    return chunks
+
+
+class ChunkIndex:
+    """
+    Per-document chunk index, built once at upload and stored next to
+    processed/{doc_id}.txt so chat doesn't re-chunk the text on every question.
+    Also holds a BM25 inverted index (term -> [[chunk_no, tf], ...]).
+    """
+
+    def __init__(
+        self,
+        chunks: List[Dict[str, Any]],
+        max_chars: int = 900,
+        overlap: int = 120,
+        postings: Optional[Dict[str, List[List[int]]]] = None,
+        lengths: Optional[List[int]] = None,
+    ):
+        self.chunks = chunks
+        self.max_chars = max_chars
+        self.overlap = overlap
+        self.postings: Dict[str, List[List[int]]] = postings or {}
+        self.lengths: List[int] = lengths or []
+        self.avgdl = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    @classmethod
+    def build(cls, text: str, max_chars: int = 900, overlap: int = 120) -> "ChunkIndex":
+        index = cls([], max_chars, overlap)
+        index.append(text)
+        return index
+
+    @classmethod
+    def build_from_file(
+        cls, path: Path, sections: Optional[List[int]] = None, max_chars: int = 900, overlap: int = 120
+    ) -> Tuple["ChunkIndex", int]:
+        """
+        Chunks a text file section by section (e.g. one per spreadsheet sheet),
+        so no chunk spans two sections and only one section is in memory.
+        Returns the index and the total number of chars.
+        """
+        index = cls([], max_chars, overlap)
+        bounds = sorted(set(sections or [0]) | {0})
+        pos = 0
+        # newline="": section offsets count "\r\n" as two chars, as written
+        with open(path, encoding="utf-8", newline="") as f:
+            for nxt in bounds[1:] + [None]:
+                part = f.read() if nxt is None else f.read(nxt - pos)
+                index.append(part)
+                pos += len(part)
+        return index, pos
+
+    def append(self, text: str) -> None:
+        """
+        Adds the chunks of another piece of text (e.g. the next PDF pages).
+        Chunks never span two appends.
+        """
+        for chunk in split_chunks(normalize_text(text), self.max_chars, self.overlap):
+            toks = tokenize(chunk)
+            tf = Counter(toks)
+            chunk_no = len(self.chunks)
+            for term, cnt in tf.items():
+                self.postings.setdefault(term, []).append([chunk_no, cnt])
+            self.lengths.append(len(toks))
+            self.chunks.append({"text": chunk})
+        self.avgdl = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def search(self, terms: List[str], k: int = 4) -> List[Tuple[int, float]]:
+        """
+        BM25 top-k as (chunk_no, score). Only the postings of the query terms
+        are touched, so cost depends on the query and not on document size.
+        """
+        n = len(self.chunks)
+        if not n or not terms:
+            return []
+
+        # rarest terms first, they carry most of the score
+        plists = [self.postings[t] for t in set(terms) if t in self.postings]
+        plists.sort(key=len)
+
+        scores: Dict[int, float] = defaultdict(float)
+        avgdl = self.avgdl or 1.0
+        for plist in plists:
+            df = len(plist)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for chunk_no, tf in plist:
+                norm = 1 - BM25_B + BM25_B * self.lengths[chunk_no] / avgdl
+                scores[chunk_no] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def texts(self) -> List[str]:
+        return [c["text"] for c in self.chunks]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": INDEX_VERSION,
+            "max_chars": self.max_chars,
+            "overlap": self.overlap,
+            "chunks": self.chunks,
+            "postings": self.postings,
+            "lengths": self.lengths,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ChunkIndex":
+        return cls(
+            data.get("chunks", []),
+            data.get("max_chars", 900),
+            data.get("overlap", 120),
+            data.get("postings"),
+            data.get("lengths"),
+        )
+
+    def save(self, path: Path) -> None:
+        # write to a temp file first so readers never see a half-written index
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.to_dict(), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def index_path_for(text_path: Path) -> Path:
+    # processed/{doc_id}.txt -> processed/{doc_id}.index.json
+    return text_path.with_suffix(".index.json")
+
+
+@lru_cache(maxsize=32)
+def _load_cached(path: str, mtime_ns: int) -> Optional[ChunkIndex]:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if data.get("version") != INDEX_VERSION:
+        return None
+    return ChunkIndex.from_dict(data)
+
+
+def load_chunk_index(path: Optional[str]) -> Optional[ChunkIndex]:
+    """Returns None if the index is missing or stale, caller falls back to building from text."""
+    if not path:
+        return None
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _load_cached(path, mtime_ns)
@@ -0,0 +1,114 @@
+import math
+from typing import Any, Dict, List, Sequence, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.chunk_index import tokenize
+
+# rough chars per token for English BPE tokenizers (llama ~4, kept a bit
+# lower so estimates err on the safe side)
+CHARS_PER_TOKEN = 3.5
+# slack for chat template tokens / estimation error
+SAFETY_TOKENS = 48
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def prompt_budget(template: str, answer_tokens: int, num_ctx: int = 0) -> int:
+    """Tokens left for variable context once the fixed prompt and the answer are accounted for."""
+    num_ctx = num_ctx or settings.llm_num_ctx
+    return max(0, num_ctx - answer_tokens - estimate_tokens(template) - SAFETY_TOKENS)
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    max_chars = int(tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    # don't end mid-word
+    space = cut.rfind(" ")
+    return cut[:space] if space > max_chars // 2 else cut
+
+
+class Packed:
+    """Result of pack(): the selected pieces (best first) and what didn't fit."""
+
+    def __init__(self, pieces: List[str], budget: int, used: int, dropped: int, dropped_tokens: int, truncated: bool):
+        self.pieces = pieces
+        self.budget = budget
+        self.used = used
+        self.dropped = dropped
+        self.dropped_tokens = dropped_tokens
+        self.truncated = truncated
+
+    def join(self, separator: str) -> str:
+        return separator.join(self.pieces)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "budget_tokens": self.budget,
+            "packed": len(self.pieces),
+            "packed_tokens": self.used,
+            "dropped": self.dropped,
+            "dropped_tokens": self.dropped_tokens,
+            "truncated": self.truncated,
+        }
+
+
+def pack(
+    scored: Sequence[Tuple[str, float]],
+    budget: int,
+    separator: str = "\n\n",
+    endpoint: str = "",
+    truncate_first: bool = True,
+) -> Packed:
+    """
+    Greedy: highest score first, every piece that still fits goes in (a smaller
+    lower-ranked piece may fill the gap a big one left). If not even the best
+    piece fits, it's cut to the budget so the prompt never goes empty.
+    """
+    sep_tokens = estimate_tokens(separator)
+    pieces: List[str] = []
+    used = dropped = dropped_tokens = 0
+    truncated = False
+
+    for text, _score in sorted(scored, key=lambda x: x[1], reverse=True):
+        cost = estimate_tokens(text) + (sep_tokens if pieces else 0)
+        if used + cost <= budget:
+            pieces.append(text)
+            used += cost
+        elif not pieces and truncate_first and budget > 0:
+            cut = truncate_to_tokens(text, budget)
+            pieces.append(cut)
+            used += estimate_tokens(cut)
+            dropped_tokens += estimate_tokens(text) - estimate_tokens(cut)
+            truncated = True
+        else:
+            dropped += 1
+            dropped_tokens += estimate_tokens(text)
+
+    packed = Packed(pieces, budget, used, dropped, dropped_tokens, truncated)
+    if endpoint:
+        metrics.CONTEXT_PACKED_TOKENS.observe(used, endpoint=endpoint)
+        metrics.CONTEXT_PIECES_TOTAL.inc(len(pieces), endpoint=endpoint, result="packed")
+        metrics.CONTEXT_PIECES_TOTAL.inc(dropped, endpoint=endpoint, result="dropped")
+        if truncated:
+            metrics.CONTEXT_PIECES_TOTAL.inc(endpoint=endpoint, result="truncated")
+    return packed
+
+
+def rank_by_overlap(texts: Sequence[str], reference: str, recency_weight: float = 0.25) -> List[Tuple[str, float]]:
+    """
+    Scores texts by word overlap with `reference` (e.g. existing questions vs the
+    topics a prompt asks for), plus a small bonus for later items.
+    """
+    ref = set(tokenize(reference))
+    n = len(texts)
+    out: List[Tuple[str, float]] = []
+    for i, text in enumerate(texts):
+        toks = set(tokenize(text))
+        overlap = len(toks & ref) / math.sqrt(len(toks)) if toks else 0.0
+        out.append((text, overlap + recency_weight * (i + 1) / n))
+    return out
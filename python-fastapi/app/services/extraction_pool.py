@@ -0,0 +1,137 @@
+import asyncio
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.core import profiling
+from app.core.config import settings
+from app.services.extractors import extract_pdf_pages, extract_to_file, merge_pdf_pages, pdf_page_count
+from app.services.chunk_index import ChunkIndex
+
+
+class ExtractionTimeout(RuntimeError):
+    pass
+
+
+def _warm() -> None:
+    # import the heavy parsers once per worker so the first upload doesn't pay for it
+    import pypdf  # noqa: F401
+    import docx  # noqa: F401
+    import pandas  # noqa: F401
+    import openpyxl  # noqa: F401
+
+
+def process_document(upload_path: str, text_path: str, index_path: str) -> int:
+    """
+    Runs inside a worker process: extract, write processed text and the chunk index.
+    Module-level so it can be pickled by the pool. Returns the text length only,
+    the text itself stays on disk.
+    """
+    # written straight to disk (spreadsheets are streamed), then chunked per section
+    sections = extract_to_file(Path(upload_path), Path(text_path))
+    index, chars = ChunkIndex.build_from_file(Path(text_path), sections)
+    index.save(Path(index_path))
+    return chars
+
+
+def finish_document(text: str, text_path: str, index_path: str) -> int:
+    Path(text_path).write_text(text, encoding="utf-8")
+    ChunkIndex.build(text).save(Path(index_path))
+    return len(text)
+
+
+def _page_ranges(pages: int, parts: int) -> List[Tuple[int, int]]:
+    size = math.ceil(pages / parts)
+    return [(start, min(start + size, pages)) for start in range(0, pages, size)]
+
+
+class ExtractionPool:
+    """
+    CPU-bound parsing (pypdf, python-docx, pandas) runs here, never on the event loop.
+    One pool per app, started in the lifespan hook.
+    """
+
+    _executor: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def _create(cls) -> ProcessPoolExecutor:
+        # spawn: forking a process that already runs an event loop + threads is asking for trouble
+        return ProcessPoolExecutor(
+            max_workers=settings.extract_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    @classmethod
+    async def start(cls) -> None:
+        if cls._executor is None:
+            cls._executor = cls._create()
+        loop = asyncio.get_running_loop()
+        # one task per worker makes the pool spawn all of them now
+        await asyncio.gather(*[
+            loop.run_in_executor(cls._executor, _warm) for _ in range(settings.extract_workers)
+        ])
+
+    @classmethod
+    def shutdown(cls) -> None:
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+        cls._executor = None
+
+    @classmethod
+    def _restart(cls, broken: ProcessPoolExecutor) -> None:
+        # a running task can't be cancelled, only its process killed;
+        # that breaks the whole pool, so replace it
+        if cls._executor is broken:
+            cls._executor = cls._create()
+        for p in list((getattr(broken, "_processes", None) or {}).values()):
+            p.kill()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    async def run(cls, fn, *args):
+        if profiling.active():
+            # profiled request: run here so cProfile sees the parsing (blocks the loop, admin only)
+            return fn(*args)
+
+        if cls._executor is None:
+            # used outside the app lifespan (scripts etc.)
+            cls._executor = cls._create()
+
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = cls._executor
+            fut = loop.run_in_executor(executor, fn, *args)
+            try:
+                return await asyncio.wait_for(fut, settings.extract_timeout_seconds)
+            except asyncio.TimeoutError:
+                cls._restart(executor)
+                raise ExtractionTimeout(f"Extraction took longer than {settings.extract_timeout_seconds:g}s")
+            except BrokenProcessPool:
+                # another job's timeout killed the pool under us, retry once on the new one
+                if attempt or cls._executor is executor:
+                    raise
+
+    @classmethod
+    async def process_document(cls, upload_path: Path, text_path: Path, index_path: Path) -> int:
+        if upload_path.suffix.lower() == ".pdf" and settings.extract_workers > 1:
+            pages = await cls.run(pdf_page_count, str(upload_path))
+            if pages >= settings.pdf_parallel_min_pages:
+                return await cls._process_pdf_parallel(upload_path, text_path, index_path, pages)
+        return await cls.run(process_document, str(upload_path), str(text_path), str(index_path))
+
+    @classmethod
+    async def _process_pdf_parallel(cls, upload_path: Path, text_path: Path, index_path: Path, pages: int) -> int:
+        """
+        pypdf is single-threaded, so big PDFs are split into page ranges, each
+        worker opens the file on its own, results are merged in page order.
+        """
+        parts = min(settings.extract_workers, math.ceil(pages / max(1, settings.pdf_min_pages_per_worker)))
+        ranges = _page_ranges(pages, max(1, parts))
+        results = await asyncio.gather(*[
+            cls.run(extract_pdf_pages, str(upload_path), start, end, False) for (start, end) in ranges
+        ])
+        text = merge_pdf_pages([page for chunk in results for page in chunk])
+        return await cls.run(finish_document, text, str(text_path), str(index_path))
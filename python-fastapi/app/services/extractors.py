@@ -1,10 +1,64 @@
+import csv
+import io
 from pathlib import Path
-from typing import List
+from typing import Iterable, List, Optional, TextIO
+
+from app.core.config import settings
 
 def _clean(s: str) -> str:
     # lightweight cleanup to avoid giant whitespace
     return "\n".join(line.rstrip() for line in s.splitlines()).strip()
 
+
+class _CleanWriter:
+    """
+    Streaming version of _clean: rstrips lines, drops leading/trailing blank
+    space of the whole output. Text written in pieces ends up exactly as
+    _clean("".join(pieces)) (for "\n" line endings). Tracks chars written.
+    """
+
+    def __init__(self, out: TextIO):
+        self.out = out
+        self.chars = 0
+        self._partial = ""
+        self._blank_lines = 0
+        self._started = False
+
+    def write(self, s: str) -> None:
+        lines = (self._partial + s).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line)
+
+    def _line(self, line: str) -> None:
+        line = line.rstrip()
+        if not self._started:
+            line = line.lstrip()
+            if not line:
+                return
+            self._emit(line)
+            self._started = True
+            return
+        if not line:
+            # held back until we know it's not trailing
+            self._blank_lines += 1
+            return
+        self._emit("\n" * (self._blank_lines + 1) + line)
+        self._blank_lines = 0
+
+    def _emit(self, s: str) -> None:
+        self.out.write(s)
+        self.chars += len(s)
+
+    def section_start(self) -> int:
+        """Offset the next non-blank content will be written at."""
+        return self.chars + (self._blank_lines + 1 if self._started else 0)
+
+    def close(self) -> None:
+        if self._partial:
+            self._line(self._partial)
+            self._partial = ""
+
 def extract_text_from_file(path: Path) -> str:
     """
     Extracts text from:
@@ -35,18 +89,82 @@ def extract_text_from_file(path: Path) -> str:
     return f"[Unsupported file type: {suffix}]"
 
 
+def extract_to_file(path: Path, out_path: Path) -> List[int]:
+    """
+    Same text as extract_text_from_file, written straight to out_path.
+    Spreadsheets are streamed in row batches, so memory stays bounded by
+    the batch size instead of the file size.
+    Returns section start offsets (one per sheet for .xlsx) for chunking.
+    """
+    suffix = path.suffix.lower()
+    # newline="": the file holds exactly the chars counted for the section offsets
+    with open(out_path, "w", encoding="utf-8", newline="") as f:
+        w = _CleanWriter(f)
+        if suffix == ".csv":
+            sections = _stream_csv(path, w)
+        elif suffix == ".xlsx":
+            sections = _stream_xlsx(path, w)
+        elif suffix == ".docx":
+            _stream_docx(path, w)
+            sections = [0]
+        else:
+            w.write(extract_text_from_file(path))
+            sections = [0]
+        w.close()
+    return sections
+
+
 def _extract_pdf(path: Path) -> str:
     from pypdf import PdfReader
 
     reader = PdfReader(str(path))
     parts: List[str] = []
     for i, page in enumerate(reader.pages):
-        text = page.extract_text() or ""
-        parts.append(f"--- Page {i+1} ---\n{text}")
+        parts.append(format_pdf_page(i + 1, page.extract_text() or ""))
     return "\n\n".join(parts)
 
 
+def format_pdf_page(page_no: int, text: str) -> str:
+    return f"--- Page {page_no} ---\n{text}"
+
+
+def pdf_page_count(path: Path) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(str(path)).pages)
+
+
+def extract_pdf_pages(path: Path, start: int, end: int, clean: bool = True) -> List[str]:
+    """
+    Formatted text of pages [start, end) (0-based), same markers as _extract_pdf.
+    Opens the file itself so it can run in any worker process.
+    clean=False returns pages as _extract_pdf joins them, so
+    _clean("\n\n".join(ranges...)) == extract_text_from_file(path).
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(str(path))
+    end = min(end, len(reader.pages))
+    pages = [format_pdf_page(i + 1, reader.pages[i].extract_text() or "") for i in range(start, end)]
+    return [_clean(p) for p in pages] if clean else pages
+
+
+def merge_pdf_pages(pages: List[str]) -> str:
+    # counterpart of extract_pdf_pages(clean=False) for page-parallel extraction
+    return _clean("\n\n".join(pages))
+
+
 def _extract_docx(path: Path) -> str:
+    buf = io.StringIO()
+    w = _CleanWriter(buf)
+    _stream_docx(path, w)
+    w.close()
+    return buf.getvalue()
+
+
+def _extract_docx_dom(path: Path) -> str:
+    # old python-docx version, kept for comparison (benchmarks/bench_docx.py).
+    # Loads the whole document model and puts all tables after all paragraphs.
     from docx import Document
 
     doc = Document(str(path))
@@ -68,21 +186,221 @@ def _extract_docx(path: Path) -> str:
     return "\n".join(parts)
 
 
-def _extract_csv(path: Path) -> str:
-    import pandas as pd
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_BODY = _W + "body"
+_W_P = _W + "p"
+_W_TBL = _W + "tbl"
+_W_TR = _W + "tr"
+_W_TC = _W + "tc"
+_W_R = _W + "r"
+_W_HYPERLINK = _W + "hyperlink"
 
-    df = pd.read_csv(path, dtype=str, keep_default_na=False, encoding_errors="ignore")
-    # Turn table into readable text
-    return df.to_csv(index=False)
+
+def _docx_run_text(r) -> str:
+    # same rules as python-docx run.text (direct children of the run only)
+    out: List[str] = []
+    for node in r:
+        tag = node.tag
+        if tag == _W + "t":
+            out.append(node.text or "")
+        elif tag in (_W + "tab", _W + "ptab"):
+            out.append("\t")
+        elif tag == _W + "br":
+            if node.get(_W + "type", "textWrapping") == "textWrapping":
+                out.append("\n")
+        elif tag == _W + "cr":
+            out.append("\n")
+        elif tag == _W + "noBreakHyphen":
+            out.append("-")
+    return "".join(out)
+
+
+def _docx_text(p) -> str:
+    # same as python-docx paragraph.text: the paragraph's own runs (also inside
+    # hyperlinks). Drawings / text boxes (mc:AlternateContent with a Choice and a
+    # Fallback copy of the same text) hang below a run and are not part of it
+    out: List[str] = []
+    for child in p:
+        if child.tag == _W_R:
+            out.append(_docx_run_text(child))
+        elif child.tag == _W_HYPERLINK:
+            out.extend(_docx_run_text(r) for r in child.iterfind(_W_R))
+    return "".join(out)
+
+
+def _docx_cells(tr) -> List[str]:
+    cells: List[str] = []
+    for tc in tr.iterfind(_W_TC):
+        # the cell's own paragraphs, like python-docx cell.text
+        text = "\n".join(_docx_text(p) for p in tc.iterfind(_W_P)).strip()
+        span = tc.find(f"{_W}tcPr/{_W}gridSpan")
+        # merged cells repeat, like python-docx row.cells
+        cells.extend([text] * (int(span.get(_W + "val", "1")) if span is not None else 1))
+    return cells
+
+
+def _stream_docx(path: Path, w: _CleanWriter) -> None:
+    """
+    Reads word/document.xml straight from the zip with iterparse and writes
+    paragraphs and table rows in document order. Finished elements are
+    cleared, so memory stays at about one paragraph / table row.
+    """
+    import zipfile
+    from xml.etree.ElementTree import iterparse
+
+    body = None
+    depth = body_depth = 0
+    table_depth = p_depth = 0
+    tables = 0
+    first = True
+
+    def put(text: str) -> None:
+        nonlocal first
+        w.write(text if first else "\n" + text)
+        first = False
+
+    with zipfile.ZipFile(path) as zf, zf.open("word/document.xml") as xml:
+        for event, el in iterparse(xml, events=("start", "end")):
+            tag = el.tag
+            if event == "start":
+                depth += 1
+                if tag == _W_BODY:
+                    body, body_depth = el, depth
+                elif tag == _W_TBL:
+                    table_depth += 1
+                    if table_depth == 1:
+                        tables += 1
+                        put(f"\n--- Table {tables} ---")
+                elif tag == _W_P:
+                    p_depth += 1
+                continue
+
+            depth -= 1
+            if tag == _W_TBL:
+                table_depth -= 1
+            elif tag == _W_TR and table_depth == 1:
+                cells = _docx_cells(el)
+                if any(cells):
+                    put(" | ".join(cells))
+                el.clear()
+            elif tag == _W_P:
+                p_depth -= 1
+                # outermost body paragraphs only (cells are handled per row,
+                # text box paragraphs are skipped with their parent's drawing)
+                if p_depth == 0 and table_depth == 0:
+                    text = _docx_text(el)
+                    if text.strip():
+                        put(text)
+
+            if body is not None and depth == body_depth:
+                # a top-level block is done, drop it
+                body.clear()
+
+
+def _extract_csv(path: Path) -> str:
+    buf = io.StringIO()
+    w = _CleanWriter(buf)
+    _stream_csv(path, w)
+    w.close()
+    return buf.getvalue()
 
 
 def _extract_xlsx(path: Path) -> str:
+    buf = io.StringIO()
+    w = _CleanWriter(buf)
+    _stream_xlsx(path, w)
+    w.close()
+    return buf.getvalue()
+
+
+def _cap_cell(value: str, max_chars: int) -> str:
+    return value if len(value) <= max_chars else value[:max_chars] + "…"
+
+
+def _stream_csv(path: Path, w: _CleanWriter) -> List[int]:
     import pandas as pd
 
-    xls = pd.ExcelFile(path)
-    parts: List[str] = []
-    for sheet_name in xls.sheet_names:
-        df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str, keep_default_na=False)
-        parts.append(f"--- Sheet: {sheet_name} ---")
-        parts.append(df.to_csv(index=False))
-    return "\n\n".join(parts)
+    max_rows = settings.tabular_max_rows
+    max_cell = settings.tabular_max_cell_chars
+    rows = 0
+    reader = pd.read_csv(
+        path,
+        dtype=str,
+        keep_default_na=False,
+        encoding_errors="ignore",
+        chunksize=settings.tabular_batch_rows,
+    )
+    with reader:
+        for i, df in enumerate(reader):
+            if rows + len(df) > max_rows:
+                df = df.iloc[: max_rows - rows]
+            rows += len(df)
+            if max_cell:
+                df = df.apply(lambda col: col.map(lambda v: _cap_cell(v, max_cell)))
+            # Turn table into readable text (header only once)
+            w.write(df.to_csv(index=False, header=(i == 0), lineterminator="\n"))
+            if rows >= max_rows:
+                w.write(f"[... truncated after {max_rows} rows]\n")
+                break
+    return [0]
+
+
+def _rows_to_csv(rows: Iterable[Iterable[str]]) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    return buf.getvalue()
+
+
+def _format_cell(value, max_chars: int) -> str:
+    if value is None:
+        return ""
+    return _cap_cell(str(value), max_chars) if max_chars else str(value)
+
+
+def _stream_xlsx(path: Path, w: _CleanWriter) -> List[int]:
+    """
+    Same text as the old pandas path (read_excel + to_csv) for rectangular
+    sheets. Ragged sheets differ on purpose: blank rows are skipped, trailing
+    empty cells are dropped, and empty header cells stay empty instead of
+    becoming "Unnamed: N" columns, so no runs of commas end up in chunks.
+    """
+    from openpyxl import load_workbook
+
+    max_rows = settings.tabular_max_rows
+    max_cell = settings.tabular_max_cell_chars
+    batch_rows = settings.tabular_batch_rows
+    sections: List[int] = []
+
+    # read_only streams rows from the sheet XML instead of loading the workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet_i, ws in enumerate(wb.worksheets):
+            if sheet_i:
+                w.write("\n\n")
+            sections.append(w.section_start())
+            w.write(f"--- Sheet: {ws.title} ---\n\n")
+
+            batch: List[List[str]] = []
+            rows = 0
+            truncated = False
+            for values in ws.iter_rows(values_only=True):
+                cells = [_format_cell(v, max_cell) for v in values]
+                while cells and cells[-1] == "":
+                    cells.pop()
+                if not cells:
+                    continue
+                if rows >= max_rows:
+                    truncated = True
+                    break
+                batch.append(cells)
+                rows += 1
+                if len(batch) >= batch_rows:
+                    w.write(_rows_to_csv(batch))
+                    batch = []
+            if batch:
+                w.write(_rows_to_csv(batch))
+            if truncated:
+                w.write(f"[... truncated after {max_rows} rows]\n")
+    finally:
+        wb.close()
+    return sections
@@ -1,25 +1,139 @@
+import asyncio
 import uuid
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
+from app.core import metrics
+from app.core.config import settings
 from app.repositories.memory_repo import MemoryRepo
 from app.adapters.ollama_client import OllamaClient
+from app.adapters.llm_scheduler import Priority
+from app.services.context_packer import pack, prompt_budget, rank_by_overlap
 from app.utils.helpers import _q_hash, _norm_q
 
 
+# rough size of one "- question" line, reserved for the existing-questions lists
+TOKENS_PER_QUESTION = 30
+
+
+class _FaqBuild:
+    """A running first-page build. priority is read before each LLM call, so it can be raised."""
+
+    def __init__(self, priority: Priority):
+        self.priority = priority
+        self.task: Optional["asyncio.Task[dict]"] = None
+
+
 class FaqService:
     PAGE_SIZE = 5
     MAX_PAGES = 5
 
+    def __init__(self):
+        self.llm = OllamaClient()
+
+    # blob key (document id without one) -> first-page build running in this
+    # process, a precompute after upload or a user's build_faq; later callers attach
+    _builds: Dict[str, "_FaqBuild"] = {}
+
     async def build_faq(self, document_id: str) -> dict:
         doc = MemoryRepo.documents.get(document_id)
         if not doc:
             raise KeyError("Document not found")
 
-        text = (doc.get("text") or "")
+        # identical content uploaded before (or precomputed) -> reuse its FAQ
+        blob_key = doc.get("blob")
+        done = self._existing(document_id, blob_key)
+        if done:
+            metrics.FAQ_BUILDS_TOTAL.inc(result="cached")
+            return done
+
+        build = FaqService._builds.get(blob_key or document_id)
+        if build is not None:
+            metrics.FAQ_BUILDS_TOTAL.inc(result="attached")
+            # someone is waiting now: the build's remaining LLM calls go at FAQ_BUILD
+            build.priority = min(build.priority, Priority.FAQ_BUILD)
+            try:
+                res = await self._wait_build(build)
+                if res is not None:
+                    return {**res, "document_id": document_id}
+            except Exception as e:
+                print(f"[build_faq] running build failed, building again: {e!r}")
+            # cancel_build() runs when the last document using the blob is deleted
+            if not MemoryRepo.documents.get(document_id):
+                raise KeyError("Document not found")
+
+        metrics.FAQ_BUILDS_TOTAL.inc(result="built")
+        build = self._start_build(document_id, doc, blob_key, Priority.FAQ_BUILD)
+        res = await self._wait_build(build)
+        if res is None:
+            # cancel_build(): the document was deleted while building
+            raise KeyError("Document not found")
+        return res
+
+    async def _wait_build(self, build: "_FaqBuild") -> Optional[dict]:
+        """
+        Result of the build, or None if the build itself was cancelled (cancel_build).
+        Shielded: the build finishes (and is stored) even if this client goes away,
+        in which case our own CancelledError is raised as usual.
+        """
+        try:
+            return await asyncio.shield(build.task)
+        except asyncio.CancelledError:
+            if build.task.cancelled() and asyncio.current_task().cancelling() == 0:
+                return None
+            raise
+
+    def precompute(self, document_id: str) -> None:
+        """
+        Starts building the first FAQ page in the background (BACKGROUND priority)
+        right after ingest, so build_faq usually finds it done or running.
+        """
+        if not settings.faq_precompute:
+            return
+        doc = MemoryRepo.documents.get(document_id)
+        if not doc:
+            return
+        blob_key = doc.get("blob")
+        if (blob_key or document_id) in FaqService._builds or self._existing(document_id, blob_key):
+            return
+        self._start_build(document_id, doc, blob_key, Priority.BACKGROUND)
+
+    @classmethod
+    def cancel_build(cls, key: str) -> None:
+        build = cls._builds.get(key)
+        if build is not None:
+            build.task.cancel()
+
+    def _existing(self, document_id: str, blob_key: Optional[str]) -> Optional[dict]:
+        blob = MemoryRepo.blobs.get(blob_key) if blob_key else None
+        if blob and blob.get("faq_id"):
+            faq = MemoryRepo.faqs.get(blob["faq_id"])
+            if faq:
+                return {"faq_id": blob["faq_id"], "document_id": document_id, "count": len(faq["items"])}
+        return None
+
+    def _start_build(self, document_id: str, doc: dict, blob_key: Optional[str], priority: Priority) -> "_FaqBuild":
+        key = blob_key or document_id
+        build = _FaqBuild(priority)
+        build.task = asyncio.create_task(self._build(document_id, doc, blob_key, build))
+        FaqService._builds[key] = build
+
+        def land(task: "asyncio.Task[dict]") -> None:
+            if FaqService._builds.get(key) is build:
+                del FaqService._builds[key]
+            if not task.cancelled() and task.exception() is not None:
+                print(f"[build_faq] build for {document_id} failed: {task.exception()!r}")
+
+        build.task.add_done_callback(land)
+        return build
+
+    async def _build(self, document_id: str, doc: dict, blob_key: Optional[str], build: "_FaqBuild") -> dict:
+        # only the start of the document is used, don't load all of it;
+        # read extra since collapsing whitespace shrinks PDF text a lot
+        text = MemoryRepo.get_text(doc, 3000 * 8)
         text = " ".join(text.split())
         text_snippet = text[:3000]
 
-        topics = await self._extract_topics(text_snippet)
+        topics = await self._extract_topics(text_snippet, document_id, build.priority)
         if not topics:
             topics = [
                 "Key concepts and definitions",
@@ -29,40 +143,27 @@ class FaqService:
 
         print("TOPICS:", topics)
 
-        base_prompt = f"""
-You are an exam-prep tutor.
-
-Generate {self.PAGE_SIZE} DISTINCT study FAQ items based on the COURSE TOPICS listed below.
-
-Rules:
-- Each question MUST relate to one of the topics.
-- Do NOT focus on syllabus logistics (grading, deadlines, schedule, attendance, office hours).
-- Questions must be exam-like (define/compare/apply).
-- Answers: 3–6 sentences, include one example when possible.
-- No duplicates.
-
-Output format ONLY:
-Q: ...
-A: ...
-
-COURSE TOPICS:
-{chr(10).join(f"- {t}" for t in topics)}
-
-SYLLABUS CONTEXT (reference only):
-{text_snippet}
-""".strip()
+        # the snippet gets whatever the window has left after the fixed prompt,
+        # the answer and the top-up's existing-questions list
+        budget = prompt_budget(
+            self._build_prompt(topics, ""), settings.faq_answer_tokens + self.PAGE_SIZE * TOKENS_PER_QUESTION
+        )
+        snippet = pack([(text_snippet, 1.0)], budget, endpoint="faq_build").join("")
+        base_prompt = self._build_prompt(topics, snippet)
 
-        raw = await OllamaClient().generate(base_prompt)
-        items = self._parse_qa(raw)
+        raw = await self.llm.generate(base_prompt, build.priority, document_id)
+        with metrics.span("faq_parse"):
+            items = self._parse_qa(raw)
 
         # Strong dedupe for first page
         seen_hashes = set()
         filtered: List[Dict[str, str]] = []
-        for it in items:
-            h = _q_hash(it["q"])
-            if h not in seen_hashes:
-                seen_hashes.add(h)
-                filtered.append(it)
+        with metrics.span("faq_dedupe"):
+            for it in items:
+                h = _q_hash(it["q"])
+                if h not in seen_hashes:
+                    seen_hashes.add(h)
+                    filtered.append(it)
 
         items = filtered[: self.PAGE_SIZE]
 
@@ -80,15 +181,17 @@ EXISTING QUESTIONS (do NOT repeat or paraphrase):
 Generate {need} MORE NEW items.
 """.strip()
 
-            raw2 = await OllamaClient().generate(prompt2)
-            more = self._parse_qa(raw2)
-            for it in more:
-                h = _q_hash(it["q"])
-                if h not in seen_hashes:
-                    items.append(it)
-                    seen_hashes.add(h)
-                if len(items) >= self.PAGE_SIZE:
-                    break
+            raw2 = await self.llm.generate(prompt2, build.priority, document_id)
+            with metrics.span("faq_parse"):
+                more = self._parse_qa(raw2)
+            with metrics.span("faq_dedupe"):
+                for it in more:
+                    h = _q_hash(it["q"])
+                    if h not in seen_hashes:
+                        items.append(it)
+                        seen_hashes.add(h)
+                    if len(items) >= self.PAGE_SIZE:
+                        break
 
         faq_id = str(uuid.uuid4())
         MemoryRepo.faqs[faq_id] = {
@@ -99,32 +202,40 @@ Generate {need} MORE NEW items.
             # store as LIST (JSON-friendly), convert to set when needed
             "seen": list(seen_hashes),
         }
+        if blob_key:
+            try:
+                await MemoryRepo.blobs.aupdate_fields(blob_key, faq_id=faq_id)
+            except KeyError:
+                pass  # document deleted meanwhile
 
         return {"faq_id": faq_id, "document_id": document_id, "count": len(items)}
 
-    async def extend_faq(self, faq_id: str) -> dict:
-        faq = MemoryRepo.faqs.get(faq_id)
-        if not faq:
-            raise KeyError("FAQ not found")
+    def _build_prompt(self, topics: List[str], text_snippet: str) -> str:
+        return f"""
+You are an exam-prep tutor.
 
-        items: List[Dict[str, str]] = faq.get("items", [])
-        max_items = self.MAX_PAGES * self.PAGE_SIZE
-        if len(items) >= max_items:
-            return {"faq_id": faq_id, "added": 0, "total": len(items), "max_reached": True}
+Generate {self.PAGE_SIZE} DISTINCT study FAQ items based on the COURSE TOPICS listed below.
 
-        topics = faq.get("topics", [])
-        text_snippet = faq.get("text_snippet", "")
+Rules:
+- Each question MUST relate to one of the topics.
+- Do NOT focus on syllabus logistics (grading, deadlines, schedule, attendance, office hours).
+- Questions must be exam-like (define/compare/apply).
+- Answers: 3–6 sentences, include one example when possible.
+- No duplicates.
 
-        # Avoid duplicates: give model existing questions
-        existing_qs = "\n".join(f"- {it['q']}" for it in items[:50])
+Output format ONLY:
+Q: ...
+A: ...
 
-        # Strong dedupe using stored hashes (list -> set)
-        seen_list = faq.get("seen", [])
-        seen = set(seen_list)
+COURSE TOPICS:
+{chr(10).join(f"- {t}" for t in topics)}
 
-        print(f"[extend_faq] faq_id={faq_id} current_items={len(items)}")
+SYLLABUS CONTEXT (reference only):
+{text_snippet}
+""".strip()
 
-        prompt = f"""
+    def _extend_prompt(self, topics: List[str], existing_qs: str, text_snippet: str) -> str:
+        return f"""
 You are an exam-prep tutor.
 
 Generate {self.PAGE_SIZE} NEW and DISTINCT study FAQ items based on the COURSE TOPICS below.
@@ -148,21 +259,54 @@ SYLLABUS CONTEXT (reference only):
 {text_snippet}
 """.strip()
 
-        raw = await OllamaClient().generate(prompt)
-        new_items = self._parse_qa(raw)
+    async def extend_faq(self, faq_id: str) -> dict:
+        faq = MemoryRepo.faqs.get(faq_id)
+        if not faq:
+            raise KeyError("FAQ not found")
+
+        items: List[Dict[str, str]] = faq.get("items", [])
+        max_items = self.MAX_PAGES * self.PAGE_SIZE
+        if len(items) >= max_items:
+            return {"faq_id": faq_id, "added": 0, "total": len(items), "max_reached": True}
+
+        topics = faq.get("topics", [])
+        text_snippet = faq.get("text_snippet", "")
+
+        # Strong dedupe using stored hashes (list -> set)
+        seen_list = faq.get("seen", [])
+        seen = set(seen_list)
+
+        print(f"[extend_faq] faq_id={faq_id} current_items={len(items)}")
+
+        # Avoid duplicates: give model the existing questions closest to the topics
+        # (those are the ones it would repeat); they get up to a third of the room,
+        # the snippet the rest
+        budget = prompt_budget(self._extend_prompt(topics, "", ""), settings.faq_answer_tokens)
+        ranked = rank_by_overlap([f"- {it['q']}" for it in items], " ".join(topics))
+        existing = pack(ranked, budget // 3, "\n", endpoint="faq_extend_questions", truncate_first=False)
+        snippet = pack([(text_snippet, 1.0)], budget - existing.used, endpoint="faq_extend")
+        prompt = self._extend_prompt(topics, existing.join("\n"), snippet.join(""))
+
+        # page extensions run in the background, lowest priority
+        raw = await self.llm.generate(prompt, Priority.BACKGROUND, faq.get("document_id", ""))
+        with metrics.span("faq_parse"):
+            new_items = self._parse_qa(raw)
 
         added_items: List[Dict[str, str]] = []
-        for it in new_items:
-            h = _q_hash(it["q"])
-            if h in seen:
-                continue
-            added_items.append(it)
-            seen.add(h)
-            if len(added_items) >= self.PAGE_SIZE:
-                break
+        with metrics.span("faq_dedupe"):
+            for it in new_items:
+                h = _q_hash(it["q"])
+                if h in seen:
+                    continue
+                added_items.append(it)
+                seen.add(h)
+                if len(added_items) >= self.PAGE_SIZE:
+                    break
 
         faq["items"].extend(added_items)
         faq["seen"] = list(seen)  # persist back as list
+        # only touch these fields, extend_running etc. are owned by the job runner
+        await MemoryRepo.faqs.aupdate_fields(faq_id, items=faq["items"], seen=faq["seen"])
 
         total = len(faq["items"])
         return {
@@ -172,7 +316,9 @@ SYLLABUS CONTEXT (reference only):
             "max_reached": total >= max_items,
         }
 
-    async def _extract_topics(self, text_snippet: str) -> List[str]:
+    async def _extract_topics(
+        self, text_snippet: str, document_id: str = "", priority: Priority = Priority.FAQ_BUILD
+    ) -> List[str]:
         prompt = f"""
 Extract a list of 8-12 course CONTENT topics from this syllabus snippet.
 
@@ -185,7 +331,7 @@ SYLLABUS SNIPPET:
 {text_snippet}
 """.strip()
 
-        raw = await OllamaClient().generate(prompt)
+        raw = await self.llm.generate(prompt, priority, document_id)
         topics = [t.strip("-• \t") for t in raw.splitlines() if t.strip()]
 
         # keep short and unique (case-insensitive)
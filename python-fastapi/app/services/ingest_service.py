@@ -1,35 +1,350 @@
+import asyncio
+import hashlib
+import os
+import time
 import uuid
+import weakref
 from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
 from fastapi import UploadFile
+from app.core import metrics
 from app.core.config import settings
-from app.services.extractors import extract_text_from_file
+from app.adapters.embedder import get_embedder
+from app.adapters.llm_scheduler import Priority
+from app.services.chunk_index import ChunkIndex, index_path_for, load_chunk_index
+from app.services.vector_index import VectorIndex, vectors_path_for
+from app.services.extraction_pool import ExtractionPool
+from app.services.extractors import extract_pdf_pages, pdf_page_count
+from app.services.faq_service import FaqService
 from app.repositories.memory_repo import MemoryRepo
+from app.repositories.job_repo import JobRepo
+
+class UploadTooLarge(ValueError):
+    pass
+
+def _reusable(blob: dict) -> bool:
+    # a cancelled ("partial") or failed ("error") ingest must never stand in
+    # for the full file; "indexing" is fine, the running job completes it
+    return (blob.get("status") or "ready") in ("ready", "indexing") and Path(blob["text_path"]).exists()
+
+def _claim(blob: dict) -> dict:
+    blob["refcount"] = blob.get("refcount", 0) + 1
+    return blob
 
 class IngestService:
+    # one lock per blob key so identical concurrent uploads extract only once
+    _blob_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+    # background embedding tasks (kept here so they aren't garbage collected)
+    _embed_tasks: Set["asyncio.Task"] = set()
+
     def __init__(self):
         self.uploads_dir = Path(settings.uploads_dir)
         self.processed_dir = Path(settings.processed_dir)
         self.uploads_dir.mkdir(parents=True, exist_ok=True)
         self.processed_dir.mkdir(parents=True, exist_ok=True)
 
-    async def save_and_extract(self, file: UploadFile) -> dict:
+    async def save_and_extract(self, file: UploadFile, incremental: bool = False) -> dict:
+        """
+        incremental=True (PDF only): returns right after the upload is stored and
+        extracts page by page in a background job; chat can use the pages
+        indexed so far. Progress via /jobs/{job_id}.
+        """
         doc_id = str(uuid.uuid4())
         safe_name = (file.filename or "upload").replace("/", "_").replace("\\", "_")
         ext = Path(safe_name).suffix.lower()
-        upload_path = self.uploads_dir / f"{doc_id}__{safe_name}"
+        incoming_path = self.uploads_dir / f"{doc_id}.incoming"
 
-        content = await file.read()
-        upload_path.write_bytes(content)
+        with metrics.span("upload_write"):
+            sha256, size = await self._save_upload(file, incoming_path)
 
-        text = extract_text_from_file(upload_path)
-        text_path = self.processed_dir / f"{doc_id}.txt"
-        text_path.write_text(text, encoding="utf-8")
+        # same bytes + same extension -> same extraction, so that's the blob key
+        blob_key = f"{sha256}{ext}"
+        lock = IngestService._blob_locks.setdefault(blob_key, asyncio.Lock())
+        async with lock:
+            blob = await self._claim_existing_blob(blob_key)
+            deduplicated = blob is not None
+            if deduplicated:
+                incoming_path.unlink(missing_ok=True)
+            elif incremental and ext == ".pdf":
+                blob = await self._start_incremental(blob_key, doc_id, incoming_path)
+            else:
+                blob = await self._create_blob(blob_key, doc_id, incoming_path)
+        metrics.DOCUMENTS_TOTAL.inc(format=ext.lstrip(".") or "none", deduplicated=str(deduplicated).lower())
 
         MemoryRepo.documents[doc_id] = {
             "filename": file.filename or safe_name,
             "ext": ext,
+            "blob": blob_key,
+            "path": blob["path"],
+            "text_path": blob["text_path"],
+            "index_path": blob["index_path"],
+            "sha256": sha256,
+            "size": size,
+        }
+        if blob.get("status") == "ready":
+            # no-op if the FAQ exists / is being built already
+            FaqService().precompute(doc_id)
+        return {
+            "document_id": doc_id,
+            "filename": file.filename,
+            "deduplicated": deduplicated,
+            "job_id": blob.get("job_id") if blob.get("status") == "indexing" else None,
+        }
+
+    async def _claim_existing_blob(self, blob_key: str) -> Optional[dict]:
+        blob = MemoryRepo.blobs.get(blob_key)
+        if not blob or not _reusable(blob):
+            return None
+
+        claimed = []
+
+        def claim_if_reusable(value: dict) -> dict:
+            # checked again inside the transaction, the status may have changed
+            if not _reusable(value):
+                return value
+            claimed.append(True)
+            return _claim(value)
+
+        try:
+            blob = await MemoryRepo.blobs.amodify(blob_key, claim_if_reusable)
+        except KeyError:
+            # released by the last owner in the meantime
+            return None
+        return blob if claimed else None
+
+    async def _create_blob(self, blob_key: str, doc_id: str, incoming_path: Path) -> dict:
+        upload_path = self.uploads_dir / blob_key
+        os.replace(incoming_path, upload_path)
+
+        text_path = self.processed_dir / f"{doc_id}.txt"
+        # chunk once here, chat just loads the index
+        index_path = index_path_for(text_path)
+        try:
+            # parsing + chunking is CPU-bound, keep it off the event loop
+            with metrics.span("extract", format=upload_path.suffix.lstrip(".")):
+                chars = await ExtractionPool.process_document(upload_path, text_path, index_path)
+        except BaseException:
+            if MemoryRepo.blobs.get(blob_key) is None:
+                upload_path.unlink(missing_ok=True)
+            raise
+
+        new_blob = {
             "path": str(upload_path),
             "text_path": str(text_path),
-            "text": text,
+            "index_path": str(index_path),
+            "chars": chars,
+            "refcount": 0,
+            "faq_id": None,
+            "status": "ready",
         }
-        return {"document_id": doc_id, "filename": file.filename}
+        blob = await self._register_blob(blob_key, new_blob)
+        if blob["text_path"] == new_blob["text_path"]:
+            self._start_embedding(blob_key, text_path, index_path)
+        return blob
+
+    async def _register_blob(self, blob_key: str, new_blob: dict) -> dict:
+        def adopt(value: dict) -> dict:
+            # row left behind by a blob whose files are gone (or whose ingest was
+            # cancelled / failed) -> take it over and extract again
+            if not _reusable(value):
+                if value.get("status") in ("partial", "error"):
+                    # documents of the cancelled / failed ingest still read its files,
+                    # they go once the blob is released; so does its FAQ (built from cut text)
+                    value["stale"] = value.get("stale", []) + [value["text_path"], value["index_path"]]
+                    value["faq_id"] = None
+                value.update({k: v for k, v in new_blob.items() if k not in ("refcount", "faq_id")})
+            return _claim(value)
+
+        blob = await MemoryRepo.blobs.amodify(blob_key, adopt, default=new_blob)
+        if blob["text_path"] != new_blob["text_path"]:
+            # another worker extracted the same file first, use theirs
+            Path(new_blob["text_path"]).unlink(missing_ok=True)
+            Path(new_blob["index_path"]).unlink(missing_ok=True)
+        return blob
+
+    async def _start_incremental(self, blob_key: str, doc_id: str, incoming_path: Path) -> dict:
+        upload_path = self.uploads_dir / blob_key
+        os.replace(incoming_path, upload_path)
+
+        text_path = self.processed_dir / f"{doc_id}.txt"
+        index_path = index_path_for(text_path)
+        # exists from the start, so a repeat upload can alias it right away
+        text_path.write_text("", encoding="utf-8")
+
+        job_id = str(uuid.uuid4())
+        blob = await self._register_blob(blob_key, {
+            "path": str(upload_path),
+            "text_path": str(text_path),
+            "index_path": str(index_path),
+            "chars": 0,
+            "refcount": 0,
+            "faq_id": None,
+            "status": "indexing",
+            "job_id": job_id,
+        })
+        if blob.get("job_id") != job_id:
+            return blob
+
+        JobRepo.create(
+            job_id,
+            {
+                "status": "running", "kind": "ingest", "document_id": doc_id,
+                "pages_done": 0, "pages_total": None, "error": None, "ts": time.time(),
+            },
+        )
+        JobRepo.tasks[job_id] = asyncio.create_task(
+            self._run_incremental(job_id, blob_key, doc_id, upload_path, text_path, index_path)
+        )
+        return blob
+
+    async def _run_incremental(
+        self, job_id: str, blob_key: str, doc_id: str, upload_path: Path, text_path: Path, index_path: Path
+    ) -> None:
+        try:
+            total = await ExtractionPool.run(pdf_page_count, upload_path)
+            await JobRepo.update(job_id, pages_total=total)
+
+            index = ChunkIndex([])
+            chars = 0
+            start = 0
+            batch = max(1, settings.ingest_first_batch_pages)
+            with open(text_path, "a", encoding="utf-8") as out:
+                while start < total:
+                    end = min(start + batch, total)
+                    with metrics.span("extract", format="pdf"):
+                        pages = await ExtractionPool.run(extract_pdf_pages, upload_path, start, end)
+                    segment = ("\n\n" if chars else "") + "\n\n".join(pages)
+                    out.write(segment)
+                    out.flush()
+
+                    # chunk + persist off the loop; once saved, chat sees these pages
+                    with metrics.span("chunk"):
+                        await asyncio.to_thread(index.append, segment)
+                    await asyncio.to_thread(index.save, index_path)
+                    chars += len(segment)
+
+                    await MemoryRepo.blobs.aupdate_fields(blob_key, chars=chars)
+                    await JobRepo.update(job_id, pages_done=end)
+                    start = end
+                    batch = min(batch * 2, max(1, settings.ingest_max_batch_pages))
+
+            if not index.chunks:
+                await asyncio.to_thread(index.save, index_path)
+            await MemoryRepo.blobs.aupdate_fields(blob_key, status="ready", chars=chars)
+            await JobRepo.finish(job_id, status="done")
+            self._start_embedding(blob_key, text_path, index_path)
+            FaqService().precompute(doc_id)
+        except asyncio.CancelledError:
+            # keep what was indexed so far
+            await self._set_blob_status(blob_key, "partial")
+            await JobRepo.finish(job_id, status="cancelled")
+            raise
+        except Exception as e:
+            await self._set_blob_status(blob_key, "error")
+            await JobRepo.finish(job_id, status="error", error=repr(e))
+        finally:
+            JobRepo.tasks.pop(job_id, None)
+
+    def _start_embedding(self, blob_key: str, text_path: Path, index_path: Path) -> None:
+        embedder = get_embedder()
+        if embedder is None:
+            return
+        task = asyncio.create_task(self._embed_chunks(embedder, blob_key, text_path, index_path))
+        IngestService._embed_tasks.add(task)
+        task.add_done_callback(IngestService._embed_tasks.discard)
+
+    async def _embed_chunks(self, embedder, blob_key: str, text_path: Path, index_path: Path) -> None:
+        """
+        Embeds every chunk once, after ingest. Until the matrix is saved (or if
+        this fails) chat simply retrieves with BM25 only.
+        """
+        try:
+            index = load_chunk_index(str(index_path))
+            if index is None or not len(index):
+                return
+            texts = index.texts()
+            batch = max(1, settings.embed_batch_size)
+            parts = []
+            for i in range(0, len(texts), batch):
+                parts.append(await embedder.embed(texts[i:i + batch], Priority.BACKGROUND, blob_key))
+            vectors = VectorIndex(np.vstack(parts))
+            await asyncio.to_thread(vectors.save, vectors_path_for(text_path, embedder.name))
+        except Exception as e:
+            print(f"[embed] blob={blob_key} failed: {e!r}")
+
+    async def _set_blob_status(self, blob_key: str, status: str) -> None:
+        try:
+            await MemoryRepo.blobs.aupdate_fields(blob_key, status=status)
+        except KeyError:
+            pass  # document deleted meanwhile
+
+    async def delete_document(self, document_id: str) -> None:
+        doc = MemoryRepo.documents.get(document_id)
+        if not doc:
+            raise KeyError("Document not found")
+        await asyncio.to_thread(MemoryRepo.documents.__delitem__, document_id)
+
+        blob_key = doc.get("blob")
+        if not blob_key:
+            return
+
+        released: List[dict] = []
+
+        def release(value: dict) -> Optional[dict]:
+            value["refcount"] = value.get("refcount", 1) - 1
+            if value["refcount"] > 0:
+                return value
+            released.append(value)
+            return None
+
+        try:
+            await MemoryRepo.blobs.amodify(blob_key, release)
+        except KeyError:
+            return
+
+        # last reference gone -> stop a running ingest and drop the stored files
+        for blob in released:
+            task = JobRepo.tasks.get(blob.get("job_id") or "")
+            if task is not None:
+                task.cancel()
+            FaqService.cancel_build(blob_key)
+            for key in ("path", "text_path", "index_path"):
+                Path(blob[key]).unlink(missing_ok=True)
+            for stale in blob.get("stale", []):
+                Path(stale).unlink(missing_ok=True)
+            embedder = get_embedder()
+            if embedder is not None:
+                for text_path in [blob["text_path"], *blob.get("stale", [])[::2]]:
+                    vectors_path_for(Path(text_path), embedder.name).unlink(missing_ok=True)
+
+    async def _save_upload(self, file: UploadFile, dest: Path) -> Tuple[str, int]:
+        """
+        Copies the upload to dest in fixed-size chunks, hashing in the same pass.
+        Peak memory is one chunk no matter how big the file is.
+        """
+        max_bytes = settings.max_upload_bytes
+        # multipart parser may already know the size, fail before copying anything
+        if file.size is not None and file.size > max_bytes:
+            raise UploadTooLarge(f"File too large ({file.size} bytes, max {max_bytes})")
+
+        h = hashlib.sha256()
+        size = 0
+        tmp = dest.with_name(dest.name + ".part")
+        try:
+            with open(tmp, "wb") as out:
+                while True:
+                    chunk = await file.read(settings.upload_chunk_bytes)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLarge(f"File too large (over {max_bytes} bytes)")
+                    h.update(chunk)
+                    out.write(chunk)
+            os.replace(tmp, dest)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return h.hexdigest(), size
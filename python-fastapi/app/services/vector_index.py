@@ -0,0 +1,80 @@
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# reciprocal rank fusion constant (the usual 60 from the RRF paper)
+RRF_K = 60
+
+
+class VectorIndex:
+    """
+    Chunk embeddings of one document as a contiguous float32 matrix
+    (row i = chunk i of the ChunkIndex, rows L2-normalized).
+    Stored next to the text as processed/{doc_id}.{embedder}.npy.
+    """
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    def search(self, query: np.ndarray, k: int = 4) -> List[Tuple[int, float]]:
+        """Cosine top-k as (chunk_no, score): one matrix-vector product + argpartition."""
+        n = len(self)
+        if not n or k <= 0:
+            return []
+        scores = self.matrix @ query.astype(np.float32, copy=False)
+        if k < n:
+            top = np.argpartition(scores, n - k)[n - k:]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def save(self, path: Path) -> None:
+        # temp file first so readers never see a half-written matrix
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, self.matrix)
+        os.replace(tmp, path)
+
+
+def vectors_path_for(text_path: Path, embedder_name: str) -> Path:
+    # processed/{doc_id}.txt -> processed/{doc_id}.{embedder}.npy
+    return text_path.with_suffix(f".{embedder_name}.npy")
+
+
+@lru_cache(maxsize=32)
+def _load_cached(path: str, mtime_ns: int) -> VectorIndex:
+    return VectorIndex(np.load(path))
+
+
+def load_vector_index(path: Optional[Path]) -> Optional[VectorIndex]:
+    """None if there are no embeddings (yet), caller then uses BM25 only."""
+    if path is None:
+        return None
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _load_cached(str(path), mtime_ns)
+
+
+def rrf_fuse(*rankings: List[Tuple[int, float]], k: int = 4) -> List[Tuple[int, float]]:
+    """
+    Reciprocal rank fusion: sum of 1 / (RRF_K + rank) over the rankings.
+    Works on ranks only, so BM25 and cosine scores don't need to be comparable.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (chunk_no, _score) in enumerate(ranking):
+            fused[chunk_no] = fused.get(chunk_no, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)[:k]
@@ -0,0 +1,69 @@
+"""
+Streaming DOCX extractor vs. the old python-docx one.
+
+    cd python-fastapi
+    python -m benchmarks.bench_docx --paragraphs 20000 --tables 50
+
+Prints time and peak Python memory (tracemalloc) for both, and checks that
+they produce the same text when all tables come after the paragraphs
+(the only layout the old extractor keeps in order).
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from app.services.extractors import _clean, _extract_docx, _extract_docx_dom
+
+
+def make_docx(path: Path, paragraphs: int, tables: int, rows: int = 20) -> None:
+    from docx import Document
+
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(f"Paragraph {i}: the course covers topic {i % 97} in week {i % 14}.")
+    for t in range(tables):
+        table = doc.add_table(rows=rows, cols=3)
+        for r, row in enumerate(table.rows):
+            for c, cell in enumerate(row.cells):
+                cell.text = f"t{t} r{r} c{c}"
+    doc.save(str(path))
+
+
+def measure(fn, path: Path):
+    tracemalloc.start()
+    started = time.perf_counter()
+    text = fn(path)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return text, elapsed, peak
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--paragraphs", type=int, default=20000)
+    ap.add_argument("--tables", type=int, default=50)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.docx"
+        make_docx(path, args.paragraphs, args.tables)
+        print(f"{path.stat().st_size / 1e6:.1f} MB, {args.paragraphs} paragraphs, {args.tables} tables")
+
+        results = {}
+        for name, fn in (("dom", lambda p: _clean(_extract_docx_dom(p))), ("stream", _extract_docx)):
+            runs = [measure(fn, path) for _ in range(args.repeat)]
+            text = runs[0][0]
+            best = min(r[1] for r in runs)
+            peak = max(r[2] for r in runs)
+            results[name] = text
+            print(f"{name:>6}: {best * 1000:8.1f} ms  peak {peak / 1e6:7.1f} MB  {len(text)} chars")
+
+        print("same text:", results["dom"] == results["stream"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Synthetic corpora for the benchmarks. Deterministic (fixed seed), so runs
+are comparable with a saved baseline.
+"""
+import csv
+import random
+from pathlib import Path
+from typing import Dict, List
+
+# approx. number of words per size; "huge" is opt-in (slow to generate)
+SIZES: Dict[str, int] = {"small": 2_000, "medium": 200_000, "huge": 2_000_000}
+FORMATS = ("txt", "pdf", "docx", "csv", "xlsx")
+
+_VOCAB = (
+    "regression classification gradient descent neural network backpropagation "
+    "overfitting regularization validation dataset feature matrix vector eigenvalue "
+    "probability distribution bayes likelihood entropy tree forest boosting kernel "
+    "margin cluster centroid embedding attention transformer token sequence loss "
+    "exam grading deadline assignment lecture week project rubric attendance quiz "
+    "the of and to in is for with that on as by this are from an be which it"
+).split()
+
+QUESTIONS: List[str] = [
+    "What is gradient descent and how does it relate to backpropagation?",
+    "How is the final exam graded?",
+    "Compare random forest and boosting.",
+    "When is the project deadline?",
+    "Explain regularization with an example.",
+    "what is the difference between classification and regression",
+    "How do transformers use attention over token sequences?",
+    "Is attendance mandatory for lectures?",
+]
+
+
+def make_words(n_words: int, seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    return rnd.choices(_VOCAB, k=n_words)
+
+
+def make_text(n_words: int, seed: int = 0) -> str:
+    words = make_words(n_words, seed)
+    lines, paras = [], []
+    for i in range(0, len(words), 12):
+        lines.append(" ".join(words[i:i + 12]).capitalize() + ".")
+        if len(lines) == 8:
+            paras.append("\n".join(lines))
+            lines = []
+    if lines:
+        paras.append("\n".join(lines))
+    return "\n\n".join(paras)
+
+
+def make_qa_output(n_items: int, seed: int = 0) -> str:
+    """Looks like an LLM FAQ answer (Q:/A: lines, some noise) for _parse_qa."""
+    rnd = random.Random(seed)
+    out = ["TOPIC: Machine learning", ""]
+    for i in range(n_items):
+        q = " ".join(rnd.choices(_VOCAB, k=8))
+        a = " ".join(rnd.choices(_VOCAB, k=30))
+        out.append(f"Q: {q} {i}?")
+        out.append(f"A: {a[:80]}")
+        out.append(f"   {a[80:]}")
+        out.append("")
+    return "\n".join(out)
+
+
+def write_txt(path: Path, n_words: int) -> None:
+    path.write_text(make_text(n_words), encoding="utf-8")
+
+
+def _pdf_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: Path, n_words: int, lines_per_page: int = 50) -> None:
+    """Minimal valid PDF (Helvetica text pages), no PDF library needed."""
+    lines = make_text(n_words).replace("\n\n", "\n").splitlines()
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+
+    objs: List[bytes] = []
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    objs.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objs.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    objs.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, page in enumerate(pages):
+        content = ("BT /F1 9 Tf 40 800 Td 11 TL " + " ".join(f"({_pdf_escape(l)}) '" for l in page) + " ET").encode("latin-1")
+        objs.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objs.append(b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for k, obj in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += f"{k} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
+
+
+def write_docx(path: Path, n_words: int) -> None:
+    from docx import Document
+
+    doc = Document()
+    for i, para in enumerate(make_text(n_words).split("\n\n")):
+        doc.add_paragraph(para.replace("\n", " "))
+        if i % 50 == 49:
+            table = doc.add_table(rows=5, cols=3)
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    cell.text = f"week {r} item {c}"
+    doc.save(str(path))
+
+
+def _rows(n_words: int):
+    words = make_words(n_words, seed=1)
+    # 10 words per row: id, week, 3 short columns, one text column
+    for i in range(0, len(words), 10):
+        w = words[i:i + 10]
+        yield [str(i // 10), str((i // 10) % 14), *w[:3], " ".join(w[3:])]
+
+
+def write_csv(path: Path, n_words: int) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "week", "a", "b", "c", "notes"])
+        writer.writerows(_rows(n_words))
+
+
+def write_xlsx(path: Path, n_words: int) -> None:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    rows = list(_rows(n_words))
+    # two sheets, so the per-sheet path is exercised too
+    for name, part in (("Grades", rows[: len(rows) // 2]), ("Schedule", rows[len(rows) // 2:])):
+        ws = wb.create_sheet(name)
+        ws.append(["id", "week", "a", "b", "c", "notes"])
+        for row in part:
+            ws.append(row)
+    wb.save(str(path))
+
+
+WRITERS = {"txt": write_txt, "pdf": write_pdf, "docx": write_docx, "csv": write_csv, "xlsx": write_xlsx}
+
+
+def build_corpus(out_dir: Path, sizes: List[str], formats=FORMATS) -> Dict[str, Path]:
+    """Writes (or reuses) one file per size x format, returns {"medium.pdf": path}."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    files: Dict[str, Path] = {}
+    for size in sizes:
+        for fmt in formats:
+            path = out_dir / f"{size}.{fmt}"
+            if not path.exists():
+                WRITERS[fmt](path, SIZES[size])
+            files[f"{size}.{fmt}"] = path
+    return files
@@ -0,0 +1,210 @@
+"""
+Microbenchmarks for the ingestion and retrieval hot paths.
+
+    cd python-fastapi
+    python -m benchmarks.run                              # small + medium corpora
+    python -m benchmarks.run --sizes small,medium,huge
+    python -m benchmarks.run --save-baseline              # write benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json   # exit 1 on regression
+
+Each case reports the best wall time over --repeat runs, throughput and the
+peak Python allocation (tracemalloc, measured in a separate run so it doesn't
+slow down the timed ones). Files in --fixtures (default benchmarks/fixtures/)
+are benchmarked with extract_text_from_file next to the synthetic corpus.
+
+Baselines are machine specific, compare runs from the same machine only.
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from benchmarks.corpus import FORMATS, QUESTIONS, SIZES, build_corpus, make_qa_output, make_text
+
+HERE = Path(__file__).parent
+DEFAULT_BASELINE = HERE / "baseline.json"
+SUPPORTED = {f".{fmt}" for fmt in FORMATS}
+
+
+class Case:
+    """One benchmark: fn() is timed, `units` / `unit` is the throughput numerator."""
+
+    def __init__(self, name: str, fn: Callable[[], Any], units: float, unit: str):
+        self.name = name
+        self.fn = fn
+        self.units = units
+        self.unit = unit
+
+
+def measure(case: Case, repeat: int) -> Dict[str, Any]:
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        case.fn()
+        times.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    case.fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "seconds": best,
+        "mean_seconds": sum(times) / len(times),
+        "throughput": case.units / best if best > 0 else None,
+        "unit": f"{case.unit}/s",
+        "peak_bytes": peak,
+    }
+
+
+def _repeat(fn: Callable[[Any], Any], items: List[Any]) -> Callable[[], None]:
+    def run() -> None:
+        for item in items:
+            fn(item)
+    return run
+
+
+def build_cases(files: Dict[str, Path], sizes: List[str]) -> List[Case]:
+    from app.services.chat_service import ChatService
+    from app.services.chunk_index import ChunkIndex
+    from app.services.extractors import extract_text_from_file
+    from app.services.faq_service import FaqService
+    from app.utils.helpers import _q_hash
+
+    chat = ChatService()
+    faq = FaqService()
+    cases: List[Case] = []
+
+    for name, path in files.items():
+        mb = path.stat().st_size / 1e6
+        cases.append(Case(f"extract[{name}]", lambda p=path: extract_text_from_file(p), mb, "MB"))
+
+    for size in sizes:
+        text = make_text(SIZES[size])
+        mb = len(text) / 1e6
+        cases.append(Case(f"chunk_text[{size}]", lambda t=text: chat._chunk_text(t), mb, "MB"))
+
+        index = ChunkIndex.build(text)
+        cases.append(Case(
+            f"retrieve_top_chunks[{size}]",
+            _repeat(lambda q, i=index: chat._retrieve_top_chunks(i, q, k=4), QUESTIONS),
+            len(QUESTIONS),
+            "queries",
+        ))
+
+    questions = QUESTIONS * 250
+    cases.append(Case("keywords", _repeat(chat._keywords, questions), len(questions), "questions"))
+    cases.append(Case("q_hash", _repeat(_q_hash, questions), len(questions), "questions"))
+
+    raw = make_qa_output(500)
+    cases.append(Case("parse_qa[500 items]", lambda: faq._parse_qa(raw), 500, "items"))
+    return cases
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], time_tol: float, mem_tol: float, min_delta: float = 0.001
+) -> List[str]:
+    """
+    Names + reasons of cases that got slower / bigger than the baseline allows.
+    Slowdowns under min_delta seconds are timer noise and ignored.
+    """
+    problems = []
+    for name, base in baseline.get("results", {}).items():
+        cur = results.get(name)
+        if cur is None:
+            continue
+        slower = cur["seconds"] - base["seconds"]
+        if cur["seconds"] > base["seconds"] * (1 + time_tol) and slower > min_delta:
+            problems.append(
+                f"{name}: {cur['seconds'] * 1000:.2f} ms vs baseline {base['seconds'] * 1000:.2f} ms "
+                f"(+{(cur['seconds'] / base['seconds'] - 1) * 100:.0f}%)"
+            )
+        if base["peak_bytes"] and cur["peak_bytes"] > base["peak_bytes"] * (1 + mem_tol):
+            problems.append(
+                f"{name}: peak {cur['peak_bytes'] / 1e6:.2f} MB vs baseline {base['peak_bytes'] / 1e6:.2f} MB"
+            )
+    return problems
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="small,medium", help=f"comma separated, from {','.join(SIZES)}")
+    ap.add_argument("--only", default="", help="run only cases whose name contains this")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--corpus-dir", default="", help="keep generated files here (default: temp dir)")
+    ap.add_argument("--fixtures", default=str(HERE / "fixtures"))
+    ap.add_argument("--out", default=str(HERE / "results.json"))
+    ap.add_argument("--baseline", default="", help="compare against this file, exit 1 on regression")
+    ap.add_argument("--save-baseline", nargs="?", const=str(DEFAULT_BASELINE), default="")
+    ap.add_argument("--time-tolerance", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    ap.add_argument("--mem-tolerance", type=float, default=0.25, help="allowed peak memory growth")
+    ap.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = ap.parse_args()
+
+    sizes = [s for s in args.sizes.split(",") if s]
+    unknown = set(sizes) - set(SIZES)
+    if unknown:
+        ap.error(f"unknown sizes: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = Path(args.corpus_dir or tmp)
+        print(f"building corpus in {corpus_dir} ...", flush=True)
+        files = build_corpus(corpus_dir, sizes)
+        fixtures = Path(args.fixtures)
+        if fixtures.is_dir():
+            for path in sorted(fixtures.iterdir()):
+                if path.suffix.lower() in SUPPORTED:
+                    files[f"fixture:{path.name}"] = path
+
+        results: Dict[str, Any] = {}
+        for case in build_cases(files, sizes):
+            if args.only and args.only not in case.name:
+                continue
+            r = measure(case, args.repeat)
+            results[case.name] = r
+            print(
+                f"{case.name:<34} {r['seconds'] * 1000:10.2f} ms  "
+                f"{r['throughput']:12.1f} {r['unit']:<13} peak {r['peak_bytes'] / 1e6:8.2f} MB",
+                flush=True,
+            )
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "machine": platform.platform(),
+        "sizes": sizes,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"results written to {args.out}")
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        problems = compare(
+            results, baseline, args.time_tolerance, args.mem_tolerance, args.min_delta_ms / 1000
+        )
+        if problems:
+            print("\n!!! PERFORMANCE REGRESSION !!!", file=sys.stderr)
+            for p in problems:
+                print("  " + p, file=sys.stderr)
+            return 1
+        print(f"no regressions vs {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
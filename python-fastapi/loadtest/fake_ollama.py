@@ -0,0 +1,224 @@
+"""
+Fake Ollama server for load tests: same endpoints and response shapes as
+Ollama, canned output, configurable latency. No model, no GPU.
+
+    cd python-fastapi
+    python -m loadtest.fake_ollama --port 11435 --latency lognormal:1.5,0.4 --token-delay 0.02
+
+    # then point the app at it
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 LLM_CACHE_ENABLED=0 uvicorn app.main:app
+
+Latency specs (seconds):
+    fixed:S  uniform:A,B  normal:MU,SIGMA  lognormal:MEDIAN,SIGMA  exp:MEAN
+
+Non-streaming calls sleep one --latency sample. Streaming calls sleep one
+--ttft sample before the first token, then --token-delay per token.
+--error-rate makes that share of calls fail with HTTP 500.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+import zlib
+from typing import AsyncIterator, Callable, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+TOPICS = [
+    "Linear regression", "Gradient descent", "Overfitting and regularization",
+    "Decision trees", "Random forests", "Neural networks", "Backpropagation",
+    "Model evaluation", "Clustering", "Dimensionality reduction",
+]
+
+_counter = itertools.count(1)
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """'lognormal:1.5,0.4' -> function returning a delay sample in seconds."""
+    kind, _, args = spec.partition(":")
+    vals = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: vals[0]
+    if kind == "uniform":
+        return lambda: random.uniform(vals[0], vals[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(vals[0], vals[1]))
+    if kind == "lognormal":
+        # parametrized by the median, which is easier to reason about than mu
+        return lambda: random.lognormvariate(math.log(vals[0]), vals[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1.0 / vals[0])
+    raise ValueError(f"unknown latency spec: {spec}")
+
+
+def canned_generate(prompt: str, json_format: bool) -> str:
+    if json_format:
+        return json.dumps({"items": [{"q": q, "a": a} for q, a in _qa(3)]})
+    if prompt.startswith("Extract a list"):
+        return "\n".join(random.sample(TOPICS, 8))
+    n = 5
+    m = re.search(r"Generate (\d+)", prompt)
+    if m:
+        n = int(m.group(1))
+    lines: List[str] = []
+    for q, a in _qa(n):
+        lines += [f"TOPIC: {random.choice(TOPICS)}", f"Q: {q}", f"A: {a}", ""]
+    return "\n".join(lines)
+
+
+def canned_chat(prompt: str) -> str:
+    m = re.search(r"QUESTION:\s*(.+)", prompt)
+    question = m.group(1).strip() if m else "your question"
+    return (
+        f"Short answer to \"{question[:80]}\": the course material covers this under "
+        f"{random.choice(TOPICS).lower()}. Definition first, then a comparison with the "
+        "closest related method, then a small worked example with two data points."
+    )
+
+
+def _qa(n: int):
+    # numbered, so the app's question dedupe keeps every item
+    for _ in range(n):
+        i = next(_counter)
+        topic = random.choice(TOPICS)
+        yield (
+            f"How would you apply {topic.lower()} in exam question {i}?",
+            f"{topic} is applied by stating the assumptions, fitting the model and checking the error. "
+            f"For example, exercise {i} uses a dataset of ten points.",
+        )
+
+
+def embed(text: str, dim: int = 64) -> List[float]:
+    # deterministic, so repeated texts get the same vector
+    rnd = random.Random(zlib.crc32(text.encode("utf-8")))
+    v = [rnd.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(x * x for x in v)) or 1.0
+    return [x / norm for x in v]
+
+
+def create_app(
+    latency: Callable[[], float],
+    ttft: Callable[[], float],
+    token_delay: float,
+    error_rate: float = 0.0,
+    model: str = "llama3.2:3b",
+) -> FastAPI:
+    app = FastAPI(title="fake-ollama")
+    stats = {"generate": 0, "chat": 0, "embed": 0, "errors": 0, "inflight": 0, "max_inflight": 0}
+
+    def fail() -> bool:
+        if error_rate and random.random() < error_rate:
+            stats["errors"] += 1
+            return True
+        return False
+
+    def final(extra: dict, n_tokens: int, seconds: float) -> dict:
+        return {
+            "model": model, "done": True, "done_reason": "stop",
+            "eval_count": n_tokens, "eval_duration": int(seconds * 1e9),
+            "prompt_eval_count": 200, "total_duration": int(seconds * 1e9), **extra,
+        }
+
+    async def stream(text: str, shape: Callable[[str], dict], done: Callable[[int, float], dict]) -> AsyncIterator[bytes]:
+        stats["inflight"] += 1
+        stats["max_inflight"] = max(stats["max_inflight"], stats["inflight"])
+        try:
+            started = asyncio.get_running_loop().time()
+            await asyncio.sleep(ttft())
+            tokens = re.findall(r"\S+\s*", text)
+            for tok in tokens:
+                yield (json.dumps({"model": model, "done": False, **shape(tok)}) + "\n").encode()
+                await asyncio.sleep(token_delay)
+            yield (json.dumps(done(len(tokens), asyncio.get_running_loop().time() - started)) + "\n").encode()
+        finally:
+            stats["inflight"] -= 1
+
+    async def respond(text: str, shape: Callable[[str], dict]) -> dict:
+        stats["inflight"] += 1
+        stats["max_inflight"] = max(stats["max_inflight"], stats["inflight"])
+        try:
+            delay = latency()
+            await asyncio.sleep(delay)
+        finally:
+            stats["inflight"] -= 1
+        return final(shape(text), len(text.split()), delay)
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        stats["generate"] += 1
+        if fail():
+            return JSONResponse({"error": "fake failure"}, status_code=500)
+        text = canned_generate(body.get("prompt", ""), body.get("format") == "json")
+        shape = lambda t: {"response": t}
+        if body.get("stream", True):
+            done = lambda n, s: final({"response": ""}, n, s)
+            return StreamingResponse(stream(text, shape, done), media_type="application/x-ndjson")
+        return await respond(text, shape)
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        stats["chat"] += 1
+        if fail():
+            return JSONResponse({"error": "fake failure"}, status_code=500)
+        messages = body.get("messages") or [{}]
+        text = canned_chat(messages[-1].get("content", ""))
+        shape = lambda t: {"message": {"role": "assistant", "content": t}}
+        if body.get("stream", True):
+            done = lambda n, s: final({"message": {"role": "assistant", "content": ""}}, n, s)
+            return StreamingResponse(stream(text, shape, done), media_type="application/x-ndjson")
+        return await respond(text, shape)
+
+    @app.post("/api/embed")
+    async def embed_batch(request: Request):
+        body = await request.json()
+        stats["embed"] += 1
+        inputs = body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        await asyncio.sleep(latency() / 10)
+        return {"model": body.get("model"), "embeddings": [embed(t) for t in inputs]}
+
+    @app.post("/api/embeddings")
+    async def embed_legacy(request: Request):
+        body = await request.json()
+        stats["embed"] += 1
+        await asyncio.sleep(latency() / 10)
+        return {"embedding": embed(body.get("prompt", ""))}
+
+    @app.get("/api/tags")
+    def tags():
+        return {"models": [{"name": model}]}
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    return app
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--latency", default="lognormal:1.0,0.4", help="non-streaming call duration")
+    ap.add_argument("--ttft", default="lognormal:0.3,0.3", help="time to first streamed token")
+    ap.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    import uvicorn
+
+    random.seed(args.seed)
+    app = create_app(parse_latency(args.latency), parse_latency(args.ttft), args.token_delay, args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Async load generator for the FastAPI service: mixed workload, per-endpoint
+throughput, latency percentiles and error rates.
+
+    cd python-fastapi
+    python -m loadtest.fake_ollama --port 11435 &
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 LLM_CACHE_ENABLED=0 uvicorn app.main:app --port 8000 &
+    python -m loadtest.loadgen --duration 60 --concurrency 20 \\
+        --mix chat=60,chat_stream=15,build_faq=10,extend_async=10,upload=5
+
+Each of --concurrency workers picks an operation by --mix weight and runs
+it, back to back (closed loop), optionally capped to --rps in total.
+--docs documents are uploaded first; questions and uploads are varied so
+the LLM cache and upload dedupe don't turn the run into cache hits (keep
+LLM_CACHE_ENABLED=0 on the server for the same reason).
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.corpus import QUESTIONS, make_text
+
+OPS = ("chat", "chat_stream", "upload", "build_faq", "extend_async")
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    # nearest rank
+    if not sorted_values:
+        return 0.0
+    k = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    def ok(self, name: str, seconds: float) -> None:
+        self.latencies[name].append(seconds)
+
+    def error(self, name: str, seconds: float, reason: str) -> None:
+        self.latencies[name].append(seconds)
+        self.errors[name][reason] += 1
+
+    def report(self) -> Dict[str, dict]:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        out = {}
+        for name in sorted(self.latencies):
+            lat = sorted(self.latencies[name])
+            errors = sum(self.errors[name].values())
+            out[name] = {
+                "count": len(lat),
+                "errors": errors,
+                "error_rate": errors / len(lat) if lat else 0.0,
+                "error_reasons": dict(self.errors[name]),
+                "rps": len(lat) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(lat, 50) * 1000,
+                "p95_ms": percentile(lat, 95) * 1000,
+                "p99_ms": percentile(lat, 99) * 1000,
+                "max_ms": lat[-1] * 1000 if lat else 0.0,
+            }
+        return out
+
+
+class LoadGen:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, doc_words: int, wait_jobs: bool):
+        self.client = client
+        self.stats = stats
+        self.doc_words = doc_words
+        self.wait_jobs = wait_jobs
+        self.docs: List[str] = []
+        # documents without an FAQ yet, so build_faq does real work (FAQs are reused per file)
+        self.fresh_docs: List[str] = []
+        self.faqs: List[str] = []
+        self.n = 0
+
+    async def timed(self, name: str, method: str, url: str, **kw) -> Optional[httpx.Response]:
+        started = time.monotonic()
+        try:
+            r = await self.client.request(method, url, **kw)
+        except httpx.HTTPError as e:
+            self.stats.error(name, time.monotonic() - started, type(e).__name__)
+            return None
+        elapsed = time.monotonic() - started
+        if r.status_code >= 400:
+            self.stats.error(name, elapsed, f"HTTP {r.status_code}")
+            return None
+        self.stats.ok(name, elapsed)
+        return r
+
+    def question(self) -> str:
+        self.n += 1
+        # varied, so identical prompts aren't served from the LLM cache
+        return f"{random.choice(QUESTIONS)} (variant {self.n})"
+
+    async def upload(self) -> None:
+        self.n += 1
+        text = make_text(self.doc_words, seed=random.randrange(1 << 30)) + f"\n\nload test document {self.n}"
+        files = {"file": (f"load-{self.n}.txt", text.encode(), "text/plain")}
+        r = await self.timed("upload", "POST", "/upload", files=files)
+        if r is not None:
+            doc_id = r.json()["document_id"]
+            self.docs.append(doc_id)
+            self.fresh_docs.append(doc_id)
+
+    async def chat(self) -> None:
+        if not self.docs:
+            return await self.upload()
+        body = {"document_id": random.choice(self.docs), "question": self.question()}
+        await self.timed("chat", "POST", "/chat", json=body)
+
+    async def chat_stream(self) -> None:
+        if not self.docs:
+            return await self.upload()
+        body = {"document_id": random.choice(self.docs), "question": self.question()}
+        started = time.monotonic()
+        first = None
+        try:
+            async with self.client.stream("POST", "/chat/stream", json=body) as r:
+                if r.status_code >= 400:
+                    self.stats.error("chat_stream", time.monotonic() - started, f"HTTP {r.status_code}")
+                    return
+                failed = False
+                async for line in r.aiter_lines():
+                    if line.startswith("event:"):
+                        if first is None:
+                            first = time.monotonic() - started
+                        failed = failed or line.strip() == "event: error"
+        except httpx.HTTPError as e:
+            self.stats.error("chat_stream", time.monotonic() - started, type(e).__name__)
+            return
+        total = time.monotonic() - started
+        if failed:
+            self.stats.error("chat_stream", total, "event: error")
+            return
+        self.stats.ok("chat_stream", total)
+        if first is not None:
+            self.stats.ok("chat_stream:first_event", first)
+
+    async def build_faq(self) -> None:
+        if not self.docs:
+            return await self.upload()
+        doc_id = self.fresh_docs.pop() if self.fresh_docs else random.choice(self.docs)
+        r = await self.timed("build_faq", "POST", f"/documents/{doc_id}/build_faq")
+        if r is not None:
+            self.faqs.append(r.json()["faq_id"])
+
+    async def extend_async(self) -> None:
+        if not self.faqs:
+            return await self.build_faq()
+        started = time.monotonic()
+        r = await self.timed("extend_async", "POST", f"/faq/{random.choice(self.faqs)}/extend_async")
+        if r is None or not self.wait_jobs:
+            return
+        data = r.json()
+        if data.get("already_running"):
+            return
+        # whole job: POST -> background extend done
+        w = await self.timed("jobs/wait", "GET", f"/jobs/{data['job_id']}/wait", params={"timeout": 60})
+        if w is None:
+            return
+        status = w.json().get("status")
+        if status == "done":
+            self.stats.ok("extend_async:job", time.monotonic() - started)
+        else:
+            self.stats.error("extend_async:job", time.monotonic() - started, f"job {status}")
+
+
+async def run(args) -> Dict[str, dict]:
+    mix = {}
+    for part in args.mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPS:
+            raise SystemExit(f"unknown operation in --mix: {name} (known: {', '.join(OPS)})")
+        mix[name] = float(weight or 1)
+    names, weights = list(mix), list(mix.values())
+
+    limits = httpx.Limits(max_connections=args.concurrency + 5, max_keepalive_connections=args.concurrency + 5)
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        stats = Stats()
+        gen = LoadGen(client, stats, args.doc_words, not args.no_wait_jobs)
+
+        print(f"uploading {args.docs} documents ...", flush=True)
+        await asyncio.gather(*(gen.upload() for _ in range(args.docs)))
+        if not gen.docs:
+            raise SystemExit("setup failed: no document could be uploaded, is the server up?")
+
+        stats.latencies.clear()
+        stats.errors.clear()
+        stats.started = time.monotonic()
+        deadline = stats.started + args.duration
+        interval = args.concurrency / args.rps if args.rps else 0.0
+
+        async def worker() -> None:
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                op = random.choices(names, weights)[0]
+                await getattr(gen, op)()
+                if interval:
+                    await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+        print(f"running {args.duration:g}s with {args.concurrency} workers ...", flush=True)
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        stats.finished = time.monotonic()
+        return stats.report()
+
+
+def print_report(report: Dict[str, dict]) -> None:
+    print(f"\n{'endpoint':<26}{'count':>7}{'err%':>7}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, r in report.items():
+        print(
+            f"{name:<26}{r['count']:>7}{r['error_rate'] * 100:>7.1f}{r['rps']:>8.2f}"
+            f"{r['p50_ms']:>10.0f}{r['p95_ms']:>10.0f}{r['p99_ms']:>10.0f}{r['max_ms']:>10.0f}"
+        )
+        if r["error_reasons"]:
+            print(f"{'':<26}errors: {r['error_reasons']}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ap.add_argument("--duration", type=float, default=30)
+    ap.add_argument("--concurrency", type=int, default=10)
+    ap.add_argument("--rps", type=float, default=0, help="total request rate cap (0 = as fast as possible)")
+    ap.add_argument("--mix", default="chat=60,chat_stream=15,build_faq=10,extend_async=10,upload=5")
+    ap.add_argument("--docs", type=int, default=5, help="documents uploaded before the run")
+    ap.add_argument("--doc-words", type=int, default=5000)
+    ap.add_argument("--timeout", type=float, default=120)
+    ap.add_argument("--no-wait-jobs", action="store_true", help="don't wait for extend_async jobs to finish")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--out", default="", help="write the report as JSON here")
+    args = ap.parse_args()
+
+    random.seed(args.seed)
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.out:
+        Path(args.out).write_text(json.dumps({"args": vars(args), "results": report}, indent=2), encoding="utf-8")
+        print(f"\nreport written to {args.out}")
+    return 1 if any(r["errors"] for r in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+from app.services.chunk_index import ChunkIndex
+
+
+def test_build_from_file_keeps_sections_with_crlf(tmp_path):
+    # "\r\n" counts as two chars in the section offsets, as written
+    first = "Sheet: A\r\nalpha,1\r\n"
+    second = "Sheet: B\r\nbeta,2\r\n"
+    path = tmp_path / "doc.txt"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(first + second)
+
+    index, chars = ChunkIndex.build_from_file(path, [0, len(first)])
+
+    assert chars == len(first + second)
+    assert index.texts() == [first.strip(), second.strip()]
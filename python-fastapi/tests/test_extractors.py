@@ -0,0 +1,87 @@
+from openpyxl import Workbook
+
+from app.services.extractors import extract_text_from_file
+
+
+def test_ragged_xlsx_sheet(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Grades"
+    ws.append(["Name", "Score", None, "Note"])
+    ws.append(["Ann", 91, None, None])
+    ws.append([])
+    ws.append(["Bob", 78.5, "x", "late", "extra"])
+    wb.create_sheet("Empty")
+    path = tmp_path / "ragged.xlsx"
+    wb.save(path)
+
+    # the pandas path gave "Name,Score,Unnamed: 2,Note,Unnamed: 4", "Ann,91,,," and
+    # a ",,,," row for the blank one; the streaming path leaves those out
+    assert extract_text_from_file(path) == (
+        "--- Sheet: Grades ---\n\n"
+        "Name,Score,,Note\n"
+        "Ann,91\n"
+        "Bob,78.5,x,late,extra\n\n\n"
+        "--- Sheet: Empty ---"
+    )
+
+
+def test_rectangular_xlsx_matches_pandas(tmp_path):
+    import pandas as pd
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Topics"
+    ws.append(["Week", "Topic"])
+    ws.append([1, "Regression"])
+    ws.append([2, "Neural nets, intro"])
+    path = tmp_path / "rect.xlsx"
+    wb.save(path)
+
+    df = pd.read_excel(path, dtype=str, keep_default_na=False)
+    expected = "--- Sheet: Topics ---\n\n" + df.to_csv(index=False).strip()
+    assert extract_text_from_file(path) == expected
+
+
+TEXT_BOX_RUN = """
+<w:r xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+     xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"
+     xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape"
+     xmlns:v="urn:schemas-microsoft-com:vml">
+  <mc:AlternateContent>
+    <mc:Choice Requires="wps">
+      <w:drawing><wps:wsp><wps:txbx><w:txbxContent>
+        <w:p><w:r><w:t>BOXTEXT</w:t></w:r></w:p>
+      </w:txbxContent></wps:txbx></wps:wsp></w:drawing>
+    </mc:Choice>
+    <mc:Fallback>
+      <w:pict><v:shape><v:textbox><w:txbxContent>
+        <w:p><w:r><w:t>BOXTEXT</w:t></w:r></w:p>
+      </w:txbxContent></v:textbox></v:shape></w:pict>
+    </mc:Fallback>
+  </mc:AlternateContent>
+</w:r>
+"""
+
+
+def test_docx_text_box_not_duplicated(tmp_path):
+    from docx import Document
+    from docx.oxml import parse_xml
+
+    from app.services.extractors import _clean, _extract_docx_dom
+
+    doc = Document()
+    doc.add_paragraph("Hello")
+    para = doc.add_paragraph("Before")
+    para._p.append(parse_xml(TEXT_BOX_RUN))
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "cell"
+    table.cell(0, 1).paragraphs[0]._p.append(parse_xml(TEXT_BOX_RUN))
+    path = tmp_path / "textbox.docx"
+    doc.save(path)
+
+    # python-docx leaves text boxes out of paragraph.text; the streaming path
+    # used to emit them twice (mc:Choice + mc:Fallback)
+    text = extract_text_from_file(path)
+    assert text == "Hello\nBefore\n\n--- Table 1 ---\ncell |"
+    assert text == _clean(_extract_docx_dom(path))
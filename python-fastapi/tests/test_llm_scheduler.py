@@ -0,0 +1,42 @@
+import asyncio
+
+from app.adapters.llm_scheduler import LlmScheduler, Priority
+
+
+def test_chat_gets_a_slot_when_faq_and_background_are_full():
+    async def scenario():
+        # non-chat limits add up to the capacity, the combined cap still keeps one free
+        sched = LlmScheduler(4, {Priority.CHAT: 4, Priority.FAQ_BUILD: 3, Priority.BACKGROUND: 2})
+        for _ in range(3):
+            await asyncio.wait_for(sched.acquire(Priority.FAQ_BUILD, "a"), 1)
+
+        # no slot left for FAQ / background work
+        waiting = [
+            asyncio.create_task(sched.acquire(Priority.FAQ_BUILD, "b")),
+            asyncio.create_task(sched.acquire(Priority.BACKGROUND, "c")),
+        ]
+        await asyncio.sleep(0)
+        assert not any(t.done() for t in waiting)
+
+        await asyncio.wait_for(sched.acquire(Priority.CHAT, "d"), 1)
+        assert sched.running == 4
+
+        for t in waiting:
+            t.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_background_runs_after_faq_releases():
+    async def scenario():
+        sched = LlmScheduler(3, {Priority.FAQ_BUILD: 2, Priority.BACKGROUND: 1})
+        await sched.acquire(Priority.FAQ_BUILD, "a")
+        await sched.acquire(Priority.FAQ_BUILD, "a")
+        background = asyncio.create_task(sched.acquire(Priority.BACKGROUND, "b"))
+        await asyncio.sleep(0)
+        assert not background.done()
+
+        sched.release(Priority.FAQ_BUILD)
+        await asyncio.wait_for(background, 1)
+
+    asyncio.run(scenario())
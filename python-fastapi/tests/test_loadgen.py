@@ -0,0 +1,14 @@
+from loadtest.loadgen import percentile
+
+
+def test_percentile_nearest_rank():
+    hundred = [float(i) for i in range(1, 101)]
+    assert percentile(hundred, 50) == 50
+    assert percentile(hundred, 95) == 95
+    assert percentile(hundred, 99) == 99
+    assert percentile(hundred, 100) == 100
+
+    ten = [float(i) for i in range(1, 11)]
+    assert percentile(ten, 50) == 5
+    assert percentile(ten, 0) == 1
+    assert percentile([], 95) == 0.0
@@ -2,11 +2,146 @@ import streamlit as st
 import requests
 import os
 import time
+import json
 
 st.title("Upload Syllabus and Chat with AI")
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://fastapi:8000")
 
+def _open_chat_stream(question: str):
+    for attempt in range(2):
+        resp = requests.post(
+            f"{BACKEND_URL}/chat/stream",
+            json={
+                "document_id": st.session_state.document_id,
+                "question": question,
+                "session_id": chat_session_id(),
+            },
+            stream=True,
+            timeout=120,
+        )
+        if attempt == 0 and resp.status_code == 404 and "Chat session not found" in resp.text:
+            # session expired (or was deleted): start a new one and ask again, once
+            resp.close()
+            st.session_state.chat_session_id = None
+            continue
+        return resp
+
+def stream_chat(question: str, result: dict):
+    """Reads /chat/stream (SSE) and yields answer text as it arrives; final payload goes into result."""
+    with _open_chat_stream(question) as resp:
+        if resp.status_code != 200:
+            raise RuntimeError(resp.text)
+        resp.encoding = "utf-8"
+
+        event = "message"
+        # chunk_size=None -> hand over bytes as soon as they arrive
+        for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line:
+                event = "message"
+            elif line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:"):].strip())
+                if event == "delta":
+                    yield data["text"]
+                elif event == "done":
+                    result.update(data)
+                elif event == "error":
+                    raise RuntimeError(data.get("detail"))
+
+def chat_session_id():
+    """One backend chat session per document, so follow-up questions reuse the context."""
+    if not st.session_state.chat_session_id:
+        try:
+            resp = requests.post(
+                f"{BACKEND_URL}/chat/sessions",
+                json={"document_id": st.session_state.document_id},
+                timeout=10,
+            )
+            resp.raise_for_status()
+            st.session_state.chat_session_id = resp.json()["session_id"]
+        except Exception:
+            # older backend / hiccup: questions are then answered one by one
+            return None
+    return st.session_state.chat_session_id
+
+@st.fragment(run_every=1)
+def faq_job_status():
+    """
+    Checks the extend job once a second (a short /jobs/{id}/wait, so a finish
+    shows up right away) and moves to the new page by itself once it is ready.
+    The wait is kept short: a fragment run holds the script, so a long poll
+    would delay Prev/Next, chat input and Cancel.
+    """
+    job_id = st.session_state.faq_job_id
+    if not (st.session_state.faq_generating and job_id):
+        return
+
+    with st.container(border=True):
+        st.info(
+            f"Generating page {st.session_state.faq_target_page}… "
+            f"you can navigate to previous pages while this runs."
+        )
+
+        if st.button("✖ Cancel"):
+            # stops the job server-side too (frees the model for other requests)
+            try:
+                requests.delete(f"{BACKEND_URL}/jobs/{job_id}", timeout=15)
+            except Exception as e:
+                st.session_state.faq_notice = f"Cancel request failed, the job may still finish: {e}"
+            st.session_state.faq_generating = False
+            st.session_state.faq_job_id = None
+            st.session_state.faq_target_page = None
+            st.rerun()
+
+        wait_s = 1 if st.session_state.get("faq_wait_armed") else 0
+        st.session_state.faq_wait_armed = True
+        try:
+            js = requests.get(
+                f"{BACKEND_URL}/jobs/{job_id}/wait",
+                params={"timeout": wait_s},
+                timeout=wait_s + 5,
+            )
+        except Exception as e:
+            st.error(f"Failed to read job status: {e}")
+            return
+
+        if js.status_code != 200:
+            st.error("Failed to read job status")
+            return
+
+        job = js.json()
+        if job["status"] == "done":
+            added = int(job.get("added") or 0)
+
+            st.session_state.faq_generating = False
+            st.session_state.faq_job_id = None
+
+            if added > 0:
+                st.session_state.faq_page = st.session_state.faq_target_page
+                st.session_state.faq_target_page = None
+            else:
+                st.session_state.faq_target_page = None
+                st.session_state.faq_notice = "No new questions were added (duplicates / model issue)."
+            # whole page, not just this fragment
+            st.rerun()
+
+        elif job["status"] == "cancelled":
+            st.session_state.faq_generating = False
+            st.session_state.faq_job_id = None
+            st.session_state.faq_target_page = None
+            st.rerun()
+
+        elif job["status"] == "error":
+            st.session_state.faq_generating = False
+            st.session_state.faq_job_id = None
+            st.session_state.faq_target_page = None
+            st.session_state.faq_notice = f"Generation failed: {job.get('error')}"
+            st.rerun()
+
+        st.caption("The page opens automatically when generation finishes.")
+
 # ---- session state ----
 st.session_state.setdefault("document_id", None)
 st.session_state.setdefault("faq_id", None)
@@ -15,16 +150,25 @@ st.session_state.setdefault("faq_page", 1)
 st.session_state.setdefault("faq_job_id", None)
 st.session_state.setdefault("faq_target_page", None)
 st.session_state.setdefault("faq_generating", False)
+# message from the job status fragment, shown after the full rerun
+st.session_state.setdefault("faq_notice", None)
 
 # store last known total_pages to avoid None problems
 st.session_state.setdefault("faq_total_pages", 1)
 
+# backend chat session of the current document (created on the first question)
+st.session_state.setdefault("chat_session_id", None)
+
 PAGE_SIZE = 5
 MAX_PAGES = 5
 
 # -----------------------
 st.header("1) Upload materials")
 uploaded_file = st.file_uploader("Choose a file", type=["txt", "pdf", "csv", "xlsx", "docx"])
+incremental = st.checkbox(
+    "Index PDFs in the background (chat starts on the first pages)",
+    value=True,
+)
 
 if st.button("Upload") and uploaded_file is not None:
     with st.status("Uploading file...", expanded=True) as status:
@@ -32,7 +176,12 @@ if st.button("Upload") and uploaded_file is not None:
         files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
 
         try:
-            resp = requests.post(f"{BACKEND_URL}/upload", files=files, timeout=60)
+            resp = requests.post(
+                f"{BACKEND_URL}/upload",
+                files=files,
+                params={"incremental": "true" if incremental else "false"},
+                timeout=60,
+            )
         except Exception as e:
             status.update(label="Upload failed", state="error")
             st.error(e)
@@ -50,8 +199,16 @@ if st.button("Upload") and uploaded_file is not None:
             st.session_state.faq_generating = False
             st.session_state.faq_total_pages = 1
 
+            # new document, new chat
+            st.session_state.chat_session_id = None
+            st.session_state.chat_messages = []
+
             status.update(label="Upload complete", state="complete")
             st.success(f"Uploaded: {data['filename']}")
+            if data.get("deduplicated"):
+                st.caption("Same file was uploaded before, reused its extracted text.")
+            if data.get("job_id"):
+                st.info("Pages are still being indexed in the background, you can already chat about the first ones.")
         else:
             status.update(label="Upload failed", state="error")
             st.error(resp.text)
@@ -135,6 +292,10 @@ if st.session_state.faq_id:
 
     st.subheader("FAQ")
 
+    if st.session_state.faq_notice:
+        st.warning(st.session_state.faq_notice)
+        st.session_state.faq_notice = None
+
     if not faq.get("items"):
         st.info("No items on this page yet.")
     else:
@@ -200,57 +361,9 @@ if st.session_state.faq_id:
 
     # ---- generation status box (non-blocking) ----
     if st.session_state.faq_generating and st.session_state.faq_job_id:
-        with st.container(border=True):
-            st.info(
-                f"Generating page {st.session_state.faq_target_page}… "
-                f"you can navigate to previous pages while this runs."
-            )
-
-            colA, colB, colC = st.columns([1, 1, 2])
-            manual = colA.button("🔄 Refresh status")
-            cancel = colB.button("✖ Cancel")
-
-            if cancel:
-                # purely UI-cancel (job still runs server-side)
-                st.session_state.faq_generating = False
-                st.session_state.faq_job_id = None
-                st.session_state.faq_target_page = None
-                st.warning("Cancelled (UI only). The server job may still finish in background.")
-                st.rerun()
-
-            if manual:
-                try:
-                    js = requests.get(f"{BACKEND_URL}/jobs/{st.session_state.faq_job_id}", timeout=10)
-                except Exception as e:
-                    st.error(f"Failed to read job status: {e}")
-                    st.stop()
-
-                if js.status_code != 200:
-                    st.error("Failed to read job status")
-                else:
-                    job = js.json()
-                    if job["status"] == "done":
-                        added = int(job.get("added") or 0)
-
-                        st.session_state.faq_generating = False
-                        st.session_state.faq_job_id = None
-
-                        if added > 0:
-                            st.session_state.faq_page = st.session_state.faq_target_page
-                            st.session_state.faq_target_page = None
-                            st.rerun()
-                        else:
-                            st.session_state.faq_target_page = None
-                            st.warning("No new questions were added (duplicates / model issue).")
-
-                    elif job["status"] == "error":
-                        st.session_state.faq_generating = False
-                        st.session_state.faq_job_id = None
-                        st.session_state.faq_target_page = None
-                        st.error(f"Generation failed: {job.get('error')}")
-
-            # optional auto-refresh hint (no infinite rerun loop)
-            colC.caption("Tip: click “Refresh status” to update when generation finishes.")
+        # the first (inline) run only peeks, so the rest of the page isn't held up
+        st.session_state.faq_wait_armed = False
+        faq_job_status()
 
 st.divider()
 st.header("3) Chat with materials")
@@ -271,33 +384,30 @@ if st.session_state.document_id:
             st.write(user_msg)
 
         with st.chat_message("assistant"):
-            with st.spinner("Thinking…"):
-                try:
-                    resp = requests.post(
-                        f"{BACKEND_URL}/chat",
-                        json={"document_id": st.session_state.document_id, "question": user_msg},
-                        timeout=120,
-                    )
-                except Exception as e:
-                    st.error(f"Chat request failed: {e}")
-                    st.stop()
-
-                if resp.status_code == 200:
-                    data = resp.json()
-                    answer = data["answer"]
-                    st.write(answer)
-
-                    # optional: show sources in expander
-                    if data.get("matched_snippet"):
-                        with st.expander("Show matched excerpt"):
-                            st.code(data["matched_snippet"])
-
-                    st.session_state.chat_messages.append({"role": "assistant", "content": answer})
-                else:
-                    st.error(resp.text)
+            result = {}
+            try:
+                answer = st.write_stream(stream_chat(user_msg, result))
+            except Exception as e:
+                st.error(f"Chat request failed: {e}")
+                st.stop()
+
+            answer = result.get("answer") or answer
+
+            # optional: show sources in expander
+            if result.get("matched_snippet"):
+                with st.expander("Show matched excerpt"):
+                    st.code(result["matched_snippet"])
+
+            st.session_state.chat_messages.append({"role": "assistant", "content": answer})
 
     if st.button("Clear chat"):
         st.session_state.chat_messages = []
+        if st.session_state.chat_session_id:
+            try:
+                requests.delete(f"{BACKEND_URL}/chat/sessions/{st.session_state.chat_session_id}", timeout=10)
+            except Exception:
+                pass  # expires on its own
+        st.session_state.chat_session_id = None
         st.rerun()
 else:
     st.info("Upload a file first.")